@@ -0,0 +1,86 @@
+from bisect import bisect_left
+
+from django.db import connection
+from recipe.catalog import get_ingredients, ingredients_cache
+from recipe.models import Ingredients, normalize_name
+
+
+AUTOCOMPLETE_LIMIT = 20
+
+
+class IngredientIndex:
+    """
+    In-process ingredient index sorted by normalized name.
+
+    Prefix matches are found with binary search, substring matches
+    with a scan over the names, which is cheap for a catalog of a few
+    thousand ingredients.
+    """
+
+    def __init__(self, ingredients, version):
+        self.version = version
+        self.items = sorted(
+            ingredients,
+            key=lambda ingredient: (ingredient.search_name, ingredient.id)
+        )
+        self.keys = [ingredient.search_name for ingredient in self.items]
+
+    def search(self, query, limit):
+        position = bisect_left(self.keys, query)
+        found = []
+        while (
+            position < len(self.keys)
+            and len(found) < limit
+            and self.keys[position].startswith(query)
+        ):
+            found.append(self.items[position])
+            position += 1
+        if len(found) < limit:
+            for key, item in zip(self.keys, self.items):
+                if query in key and not key.startswith(query):
+                    found.append(item)
+                    if len(found) == limit:
+                        break
+        return found
+
+
+_index = None
+
+
+def get_index():
+    """Index over cached ingredient catalog, rebuilt when it changes."""
+    global _index
+    version = ingredients_cache.get_version()
+    if _index is None or _index.version != version:
+        _index = IngredientIndex(get_ingredients().values(), version)
+    return _index
+
+
+def search_database(query, limit):
+    """
+    Two index-friendly queries: prefix matches first, substring ones
+    only when prefix matches do not fill the limit.
+    """
+    found = list(Ingredients.objects.filter(
+        search_name__startswith=query
+    ).order_by('search_name', 'id')[:limit])
+    if len(found) < limit:
+        found += Ingredients.objects.filter(
+            search_name__contains=query
+        ).exclude(
+            search_name__startswith=query
+        ).order_by('search_name', 'id')[:limit - len(found)]
+    return found
+
+
+def search_ingredients(query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Ingredients matching query, names starting with it go first.
+
+    PostgreSQL uses the search_name index, other databases are served
+    by the in-process index.
+    """
+    query = normalize_name(query)
+    if connection.vendor == 'postgresql':
+        return search_database(query, limit)
+    return get_index().search(query, limit)
@@ -0,0 +1,145 @@
+import csv
+import json
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+TITLE = 'Список ингредиентов'
+FONT_NAME = 'TNR'
+FONT_PATH = str(settings.BASE_DIR / 'fonts' / 'Times.ttf')
+
+
+def register_fonts():
+    """Registers PDF fonts, called once on application start."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+class Echo:
+    """File-like object that hands written lines back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListExporter:
+    """
+    Base class for shopping list export formats.
+
+    render() returns an iterable of chunks, so the document can be
+    streamed to the client without building it in memory first.
+    """
+
+    format = None
+    content_type = None
+    extension = None
+
+    @property
+    def filename(self):
+        return f'shopping_cart.{self.extension}'
+
+    def render(self, items):
+        raise NotImplementedError
+
+
+class TextExporter(ShoppingListExporter):
+    """Plain text shopping list."""
+
+    format = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def render(self, items):
+        yield f'{TITLE}\n\n'
+        for item in items:
+            yield f'{item.name} {item.amount} {item.measurement_unit}\n'
+
+
+class CsvExporter(ShoppingListExporter):
+    """CSV shopping list."""
+
+    format = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(['name', 'amount', 'measurement_unit'])
+        for item in items:
+            yield writer.writerow(item)
+
+
+class JsonExporter(ShoppingListExporter):
+    """JSON shopping list."""
+
+    format = 'json'
+    content_type = 'application/json'
+    extension = 'json'
+
+    def render(self, items):
+        yield '['
+        for index, item in enumerate(items):
+            if index:
+                yield ','
+            yield json.dumps(item._asdict(), ensure_ascii=False)
+        yield ']'
+
+
+class PdfExporter(ShoppingListExporter):
+    """PDF shopping list, split into A4 pages."""
+
+    format = 'pdf'
+    content_type = 'application/pdf'
+    extension = 'pdf'
+    left_margin = 80
+    top = 750
+    bottom_margin = 60
+
+    def begin_page(self, file, title=False):
+        pdf = file.beginText()
+        pdf.setTextOrigin(self.left_margin, self.top)
+        if title:
+            pdf.setFont(FONT_NAME, 18)
+            pdf.textLine(TITLE)
+        pdf.setFont(FONT_NAME, 12)
+        return pdf
+
+    def render(self, items):
+        buffer = BytesIO()
+        file = canvas.Canvas(buffer, pagesize=A4)
+        pdf = self.begin_page(file, title=True)
+        for item in items:
+            if pdf.getY() < self.bottom_margin:
+                file.drawText(pdf)
+                file.showPage()
+                pdf = self.begin_page(file)
+            pdf.textLine(f'{item.name} {item.amount} {item.measurement_unit}')
+        file.drawText(pdf)
+        file.showPage()
+        file.save()
+        yield buffer.getvalue()
+
+
+EXPORTERS = {
+    exporter.format: exporter
+    for exporter in (PdfExporter, TextExporter, CsvExporter, JsonExporter)
+}
+DEFAULT_FORMAT = PdfExporter.format
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Content negotiation for file downloads.
+
+    ?format= selects the export format here, so DRF must not treat it
+    as a renderer override.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
@@ -0,0 +1,209 @@
+from collections import defaultdict
+
+from api.serializers import BatchListSerializer, RecipeSerializer
+from django.conf import settings
+from django.utils.encoding import filepath_to_uri
+from recipe.catalog import get_tags, resolve_ingredients, resolve_tags
+from recipe.models import RecipeIngredients, RecipeTags
+from recipe.storage import image_storage
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from users.models import Follow
+
+
+def tag_to_dict(tag):
+    return {
+        'id': tag.id,
+        'name': tag.name,
+        'color': tag.color,
+        'slug': tag.slug,
+    }
+
+
+def ingredient_to_dict(ingredient):
+    return {
+        'id': ingredient.id,
+        'name': ingredient.name,
+        'measurement_unit': ingredient.measurement_unit,
+    }
+
+
+def user_to_dict(user, is_subscribed):
+    return {
+        'email': user.email,
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_subscribed': is_subscribed,
+    }
+
+
+def media_url(name):
+    """Same URL as image_storage.url gives, without urljoin."""
+    return image_storage.base_url + filepath_to_uri(name).lstrip('/')
+
+
+def build_recipe_fragments(recipes):
+    """
+    Same dicts as RecipeFragmentSerializer gives.
+
+    Tags and ingredients are read as value rows of the relation
+    tables and resolved through the catalog cache, no model objects
+    are created for them.
+    """
+    ids = [recipe.id for recipe in recipes]
+    tags_by_recipe = defaultdict(list)
+    for recipe_id, tag_id in RecipeTags.objects.filter(
+        recipe_id__in=ids
+    ).values_list('recipe_id', 'tag_id'):
+        tags_by_recipe[recipe_id].append(tag_id)
+    ingredient_rows = list(RecipeIngredients.objects.filter(
+        recipe_id__in=ids
+    ).order_by('id').values_list(
+        'recipe_id', 'id', 'ingredient_id', 'amount'
+    ))
+    tags = resolve_tags({
+        tag_id for tag_ids in tags_by_recipe.values() for tag_id in tag_ids
+    })
+    #  Теги идут в порядке каталога, то есть в порядке модели.
+    position = {tag_id: index for index, tag_id in enumerate(get_tags())}
+    tag_dicts = {tag_id: tag_to_dict(tag) for tag_id, tag in tags.items()}
+    ingredients = resolve_ingredients({row[2] for row in ingredient_rows})
+    ingredients_by_recipe = defaultdict(list)
+    for recipe_id, id, ingredient_id, amount in ingredient_rows:
+        ingredient = ingredients[ingredient_id]
+        ingredients_by_recipe[recipe_id].append({
+            'id': id,
+            'name': ingredient.name,
+            'measurement_unit': ingredient.measurement_unit,
+            'amount': amount,
+        })
+    fragments = []
+    for recipe in recipes:
+        image = recipe.image.name
+        tag_ids = sorted(
+            tags_by_recipe[recipe.id],
+            key=lambda tag_id: position.get(tag_id, len(position))
+        )
+        fragments.append({
+            'id': recipe.id,
+            'tags': [tag_dicts[tag_id] for tag_id in tag_ids],
+            'ingredients': ingredients_by_recipe[recipe.id],
+            'name': recipe.name,
+            'image': media_url(image) if image else None,
+            'image_variants': {
+                variant: media_url(name)
+                for variant, name in (recipe.image_variants or {}).items()
+            },
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        })
+    return fragments
+
+
+def get_subscriptions(users, request):
+    """
+    is_subscribed by user id, like CustomUserSerializer gives it.
+
+    Annotated flags are taken as is, the rest is looked up with one
+    query for all users.
+    """
+    flags = {
+        user.id: user.is_subscribed for user in users
+        if hasattr(user, 'is_subscribed')
+    }
+    missing = [user.id for user in users if user.id not in flags]
+    current = getattr(request, 'user', None)
+    if not missing or current is None or current.is_anonymous:
+        return {**dict.fromkeys(missing, False), **flags}
+    followed = set(Follow.objects.filter(
+        user=current.id,
+        author_id__in=missing
+    ).values_list('author_id', flat=True))
+    flags.update((id, id in followed) for id in missing)
+    return flags
+
+
+class FastSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer building plain dicts without DRF fields.
+
+    Output is the same as of the regular serializer of the model, the
+    check_serializers command compares them.
+    """
+
+    class Meta:
+        list_serializer_class = BatchListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    def represent(self, instances):
+        raise NotImplementedError
+
+
+class FastTagSerializer(FastSerializer):
+
+    def represent(self, tags):
+        return [tag_to_dict(tag) for tag in tags]
+
+
+class FastIngredientSerializer(FastSerializer):
+
+    def represent(self, ingredients):
+        return [ingredient_to_dict(ingredient) for ingredient in ingredients]
+
+
+class FastUserSerializer(FastSerializer):
+
+    def represent(self, users):
+        flags = get_subscriptions(users, self.context.get('request'))
+        return [user_to_dict(user, flags[user.id]) for user in users]
+
+
+class FastRecipeSerializer(RecipeSerializer):
+    """RecipeSerializer with fragments and authors built from rows."""
+
+    def build_fragments(self, recipes):
+        return build_recipe_fragments(recipes)
+
+    def represent(self, recipes):
+        #  Подписки на всех авторов страницы одним запросом.
+        authors = {recipe.author_id: recipe.author for recipe in recipes}
+        self.subscriptions = get_subscriptions(
+            list(authors.values()),
+            self.context.get('request')
+        )
+        return super().represent(recipes)
+
+    def serialize_author(self, author):
+        return user_to_dict(author, self.subscriptions[author.id])
+
+
+class FastSerializerMixin:
+    """
+    Serves safe requests with fast_serializer_class of the view.
+
+    fast_serializers turns it on or off for one viewset, by default
+    FAST_SERIALIZERS setting decides.
+    """
+
+    fast_serializer_class = None
+    fast_serializers = None
+
+    def use_fast_serializer(self):
+        enabled = self.fast_serializers
+        if enabled is None:
+            enabled = settings.FAST_SERIALIZERS
+        return (
+            enabled
+            and self.fast_serializer_class is not None
+            and getattr(self, 'request', None) is not None
+            and self.request.method in SAFE_METHODS
+        )
+
+    def get_serializer_class(self):
+        if self.use_fast_serializer():
+            return self.fast_serializer_class
+        return super().get_serializer_class()
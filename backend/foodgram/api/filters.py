@@ -0,0 +1,81 @@
+from django.db.models import Count
+from django_filters import rest_framework as filters
+from recipe.catalog import get_tags
+from recipe.models import Recipe, RecipeTags
+from recipe.search import search_recipes
+from rest_framework.filters import OrderingFilter
+
+
+class RecipeFilter(filters.FilterSet):
+    """
+    Filters for recipe list.
+
+    Tags are matched with a semi-join on RecipeTags, so recipes are
+    never duplicated and the list does not need DISTINCT. Several tags
+    match any of them, `tags_mode=all` requires all of them. `search`
+    looks through names, ingredients and texts of recipes, ordering
+    results by relevance.
+    """
+
+    TAGS_ANY = 'any'
+    TAGS_ALL = 'all'
+
+    author = filters.NumberFilter(field_name='author_id')
+    tags = filters.CharFilter(method='filter_tags')
+    tags_mode = filters.ChoiceFilter(
+        choices=((TAGS_ANY, TAGS_ANY), (TAGS_ALL, TAGS_ALL)),
+        method='filter_tags_mode'
+    )
+    is_favorited = filters.BooleanFilter(method='filter_flag')
+    is_in_shopping_cart = filters.BooleanFilter(method='filter_flag')
+    search = filters.CharFilter(method='filter_search')
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart', 'search'
+        )
+
+    def filter_tags(self, queryset, name, value):
+        slugs = set(self.data.getlist(name))
+        #  Слаги переводим в id по кэшу тегов, без join с таблицей тегов.
+        tag_ids = {
+            tag.id for tag in get_tags().values() if tag.slug in slugs
+        }
+        recipe_tags = RecipeTags.objects.filter(tag_id__in=tag_ids)
+        if self.form.cleaned_data.get('tags_mode') == self.TAGS_ALL:
+            if len(tag_ids) < len(slugs):
+                return queryset.none()
+            recipe_tags = recipe_tags.values('recipe_id').annotate(
+                tags_count=Count('tag_id', distinct=True)
+            ).filter(tags_count=len(tag_ids))
+        return queryset.filter(id__in=recipe_tags.values('recipe_id'))
+
+    def filter_tags_mode(self, queryset, name, value):
+        #  Режим учитывается в filter_tags.
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_flag(self, queryset, name, value):
+        #  is_favorited и is_in_shopping_cart - аннотации из get_queryset,
+        #  значение 0 фильтр отключает.
+        if value:
+            return queryset.filter(**{name: True})
+        return queryset
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    Ordering by ?ordering= with id as a tie breaker.
+
+    Counters repeat a lot, without the unique last key pages of equally
+    popular recipes could overlap.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and ordering[-1].lstrip('-') != 'id':
+            ordering = [*ordering, 'id']
+        return ordering
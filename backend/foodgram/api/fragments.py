@@ -0,0 +1,34 @@
+from django.core.cache import cache
+
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def get_fragment_key(recipe):
+    #  updated_at меняется при любой правке рецепта, его тегов и
+    #  ингредиентов, старые версии просто истекают.
+    return f'recipe-fragment:{recipe.id}:{recipe.updated_at.timestamp()}'
+
+
+def get_fragments(recipes, build):
+    """
+    User independent representations of recipes, in the same order.
+
+    The whole page is read from cache with one get_many. Recipes
+    missing there are passed to build at once, which returns their
+    representations in the same order.
+    """
+    keys = [get_fragment_key(recipe) for recipe in recipes]
+    fragments = cache.get_many(keys)
+    missing = [
+        (key, recipe) for key, recipe in zip(keys, recipes)
+        if key not in fragments
+    ]
+    if missing:
+        built = dict(zip(
+            [key for key, _ in missing],
+            build([recipe for _, recipe in missing])
+        ))
+        cache.set_many(built, FRAGMENT_TIMEOUT)
+        fragments.update(built)
+    return [fragments[key] for key in keys]
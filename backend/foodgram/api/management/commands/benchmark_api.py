@@ -0,0 +1,333 @@
+import csv
+import random
+import statistics
+import time
+
+from api.renderers import ORJSONRenderer
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment
+)
+from recipe.models import (
+    Favorite, Ingredients, Recipe, RecipeIngredients,
+    RecipeTags, ShopCart, Tags, normalize_name
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from users.models import Follow, User
+
+
+#  Максимальное число запросов к БД на один запрос к API. Проверяется
+#  при запуске с --check (для параметров по умолчанию), чтобы N+1 не
+#  проскочил в релиз.
+QUERY_BUDGETS = {
+    'recipes': 5,
+    'recipe': 4,
+    'subscriptions': 3,
+    'ingredients': 1,
+    'shopping_cart': 1,
+}
+RENDERING_URL = '/api/recipes/?limit=100'
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+
+
+class Command(BaseCommand):
+    """Manage command for benchmarking API endpoints."""
+
+    help = (
+        'Seeds a throwaway test database with synthetic data and '
+        'measures queries and latency of the main API endpoints.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Authors followed by each user.')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Favorite recipes of each user.')
+        parser.add_argument('--cart', type=int, default=30,
+                            help='Recipes in shopcart of each user.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Measured requests per endpoint.')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Page size for list endpoints.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--ingredients',
+            default=str(settings.BASE_DIR / 'data' / 'ingredients.csv')
+        )
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear cache before every request.')
+        parser.add_argument('--check', action='store_true',
+                            help='Fail if query budgets are exceeded.')
+        parser.add_argument(
+            '--rendering',
+            action='store_true',
+            help=f'Compare JSON renderers and response compression on '
+                 f'{RENDERING_URL}.'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            started = time.perf_counter()
+            self.seed(options)
+            self.stdout.write(
+                f'Seeded in {time.perf_counter() - started:.1f}s'
+            )
+            results = self.run_benchmarks(options)
+            rendering = (
+                self.compare_rendering(options)
+                if options['rendering'] else None
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        self.report(results)
+        if rendering:
+            self.report_rendering(rendering)
+        if options['check']:
+            self.check_budgets(results)
+
+    def seed(self, options):
+        """Fills test database with synthetic data."""
+        with open(options['ingredients'], encoding='utf8') as csv_file:
+            Ingredients.objects.bulk_create(
+                Ingredients(
+                    name=row['name'],
+                    measurement_unit=row['measurement_unit'],
+                    search_name=normalize_name(row['name'])
+                )
+                for row in csv.DictReader(csv_file)
+            )
+        Tags.objects.bulk_create(
+            Tags(name=name, slug=slug, color=color)
+            for name, slug, color in TAGS
+        )
+        password = make_password('benchmark')
+        User.objects.bulk_create(
+            User(
+                email=f'user{number}@foodgram.ru',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password
+            )
+            for number in range(options['users'])
+        )
+        user_ids = list(User.objects.values_list('id', flat=True))
+        tag_ids = list(Tags.objects.values_list('id', flat=True))
+        ingredient_ids = list(
+            Ingredients.objects.values_list('id', flat=True)
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=self.random.choice(user_ids),
+                    name=f'Рецепт {number}',
+                    image='images/benchmark.png',
+                    text='Описание рецепта. ' * 20,
+                    cooking_time=self.random.randint(5, 120)
+                )
+                for number in range(options['recipes'])
+            ),
+            batch_size=1000
+        )
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        RecipeIngredients.objects.bulk_create(
+            (
+                RecipeIngredients(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500)
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.random.sample(
+                    ingredient_ids, self.random.randint(3, 12)
+                )
+            ),
+            batch_size=1000
+        )
+        RecipeTags.objects.bulk_create(
+            (
+                RecipeTags(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.random.sample(
+                    tag_ids, self.random.randint(1, len(tag_ids))
+                )
+            ),
+            batch_size=1000
+        )
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.sample(
+                [author for author in user_ids if author != user_id],
+                options['follows']
+            )
+        )
+        for model, option in ((Favorite, 'favorites'), (ShopCart, 'cart')):
+            model.objects.bulk_create(
+                (
+                    model(user_id=user_id, recipe_id=recipe_id)
+                    for user_id in user_ids
+                    for recipe_id in self.sample(
+                        recipe_ids, options[option]
+                    )
+                ),
+                batch_size=1000
+            )
+        #  bulk_create не ведет счетчики и поисковый индекс.
+        call_command('reconcile_counters', verbosity=0)
+        call_command('rebuild_search_index', verbosity=0)
+
+    def sample(self, population, size):
+        return self.random.sample(population, min(size, len(population)))
+
+    def get_endpoints(self, options):
+        """Returns functions building URL for every measured endpoint."""
+        limit = options['limit']
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        prefixes = [
+            name[:3] for name in self.sample(
+                list(Ingredients.objects.values_list('name', flat=True)),
+                100
+            )
+        ]
+        return {
+            'recipes': lambda: (
+                f'/api/recipes/?limit={limit}'
+                f'&page={self.random.randint(1, 5)}'
+            ),
+            'recipe': lambda: (
+                f'/api/recipes/{self.random.choice(recipe_ids)}/'
+            ),
+            'subscriptions': lambda: (
+                f'/api/users/subscriptions/?limit={limit}&recipes_limit=3'
+            ),
+            'ingredients': lambda: (
+                f'/api/ingredients/?name={self.random.choice(prefixes)}'
+            ),
+            'shopping_cart': lambda: (
+                '/api/recipes/download_shopping_cart/'
+            ),
+        }
+
+    def request(self, client, url):
+        """Makes request and reads the whole response body."""
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        else:
+            response.content
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
+        return response
+
+    def run_benchmarks(self, options):
+        users = list(User.objects.all())
+        client = APIClient()
+        results = {}
+        for name, get_url in self.get_endpoints(options).items():
+            client.force_authenticate(self.random.choice(users))
+            self.request(client, get_url())
+            timings = []
+            queries = 0
+            for _ in range(options['requests']):
+                client.force_authenticate(self.random.choice(users))
+                url = get_url()
+                if options['cold']:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    self.request(client, url)
+                    timings.append(time.perf_counter() - started)
+                queries = max(queries, len(context.captured_queries))
+            results[name] = (queries, timings)
+        return results
+
+    def compare_rendering(self, options):
+        """
+        Render time of a large recipe page by every JSON renderer, and
+        response size and time with every content encoding.
+        """
+        client = APIClient()
+        client.force_authenticate(User.objects.order_by('id').first())
+        data = self.request(client, RENDERING_URL).data
+        results = {}
+        for name, renderer in (
+            ('render json', JSONRenderer()),
+            ('render orjson', ORJSONRenderer()),
+        ):
+            timings = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                body = renderer.render(data)
+                timings.append(time.perf_counter() - started)
+            results[name] = (len(body), timings)
+        for encoding in ('identity', 'gzip', 'br'):
+            timings = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                response = client.get(
+                    RENDERING_URL,
+                    HTTP_ACCEPT_ENCODING=encoding
+                )
+                timings.append(time.perf_counter() - started)
+            #  Без пакета brotli сервер ответит несжатым телом.
+            applied = response.get('Content-Encoding', 'identity')
+            results[f'wire {encoding} ({applied})'] = (
+                len(response.content), timings
+            )
+        return results
+
+    def report_rendering(self, results):
+        self.stdout.write('')
+        self.stdout.write(
+            f'{"rendering":<24}{"bytes":>10}{"p50, ms":>10}{"p95, ms":>10}'
+        )
+        for name, (size, timings) in results.items():
+            p50, p95 = self.percentiles(timings)
+            self.stdout.write(
+                f'{name:<24}{size:>10}{p50:>10.2f}{p95:>10.2f}'
+            )
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"endpoint":<16}{"queries":>8}{"p50, ms":>10}{"p95, ms":>10}'
+        )
+        for name, (queries, timings) in results.items():
+            p50, p95 = self.percentiles(timings)
+            self.stdout.write(
+                f'{name:<16}{queries:>8}{p50:>10.2f}{p95:>10.2f}'
+            )
+
+    def percentiles(self, timings):
+        if len(timings) < 2:
+            return timings[0] * 1000, timings[0] * 1000
+        cuts = statistics.quantiles(timings, n=100, method='inclusive')
+        return cuts[49] * 1000, cuts[94] * 1000
+
+    def check_budgets(self, results):
+        exceeded = [
+            f'{name}: {queries} > {QUERY_BUDGETS[name]}'
+            for name, (queries, _) in results.items()
+            if queries > QUERY_BUDGETS[name]
+        ]
+        if exceeded:
+            raise CommandError(
+                'Query budget exceeded: ' + ', '.join(exceeded)
+            )
+        self.stdout.write(self.style.SUCCESS('Query budgets are met.'))
@@ -0,0 +1,175 @@
+import time
+
+from api.fast_serializers import (
+    FastIngredientSerializer, FastRecipeSerializer, FastTagSerializer,
+    FastUserSerializer
+)
+from api.serializers import (
+    IngredientViewSerializer, RecipeSerializer, TagSerializer
+)
+from api.views import RecipeViewSet
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.test import override_settings
+from recipe.models import Ingredients, Recipe, Tags
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+from users.serializers import CustomUserSerializer
+
+
+#  Без кэша фрагментов обе стороны собирают рецепты сами.
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+class Command(BaseCommand):
+    """Manage command comparing fast serializers with regular ones."""
+
+    help = (
+        'Serializes the same objects with DRF serializers and their fast '
+        'counterparts, fails if the JSON differs and prints timings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email of user whose flags are compared, first user by '
+                 'default. Anonymous output is always compared.'
+        )
+        parser.add_argument('--limit', type=int, default=100,
+                            help='Objects serialized in every list.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs of every serializer to time.')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f'User {options["user"]} not found.')
+        else:
+            user = User.objects.order_by('id').first()
+        self.limit = options['limit']
+        self.repeat = options['repeat']
+        self.stdout.write(
+            f'{"payload":<24} {"parity":<8} {"drf, ms":>9} '
+            f'{"fast, ms":>9} {"speedup":>8}'
+        )
+        failed = []
+        with override_settings(CACHES=NO_CACHE):
+            for current in (AnonymousUser(), user):
+                if current is not None:
+                    failed += self.compare_all(current)
+        if failed:
+            raise CommandError(
+                f'Fast serializers differ in: {", ".join(failed)}.'
+            )
+        self.stdout.write(self.style.SUCCESS('Fast serializers match.'))
+
+    def compare_all(self, user):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        context = {'request': request}
+        view = RecipeViewSet(
+            action_map={'get': 'list'}, args=(), kwargs={},
+            format_kwarg=None, request=request
+        )
+        suffix = 'user' if user.is_authenticated else 'anonymous'
+        cases = [
+            (
+                f'recipes, {suffix}',
+                RecipeSerializer, FastRecipeSerializer,
+                lambda: list(view.get_queryset()[:self.limit])
+            ),
+            (
+                f'recipes bare, {suffix}',
+                RecipeSerializer, FastRecipeSerializer,
+                lambda: list(
+                    Recipe.objects.select_related('author')[:self.limit]
+                )
+            ),
+            (
+                f'users, {suffix}',
+                CustomUserSerializer, FastUserSerializer,
+                lambda: list(User.objects.order_by('id')[:self.limit])
+            ),
+        ]
+        if not user.is_authenticated:
+            cases += [
+                (
+                    'tags',
+                    TagSerializer, FastTagSerializer,
+                    lambda: list(Tags.objects.all())
+                ),
+                (
+                    'ingredients',
+                    IngredientViewSerializer, FastIngredientSerializer,
+                    lambda: list(
+                        Ingredients.objects.order_by('name')[:self.limit]
+                    )
+                ),
+            ]
+        failed = []
+        for label, regular, fast, get_objects in cases:
+            if not self.compare(label, regular, fast, get_objects, context):
+                failed.append(label)
+        return failed
+
+    def render(self, serializer_class, get_objects, context, many=True):
+        """
+        Rendered JSON and best time of repeated runs, in ms.
+
+        Timings include queries made by serializers, the fast ones
+        load relations differently.
+        """
+        timings = []
+        for _ in range(self.repeat):
+            #  Свежие объекты на каждый прогон, иначе вторая сторона
+            #  получит уже загруженные связи.
+            objects = get_objects()
+            if not many:
+                objects = objects[0]
+            started = time.perf_counter()
+            data = serializer_class(objects, many=many, context=context).data
+            timings.append((time.perf_counter() - started) * 1000)
+        return JSONRenderer().render(data), min(timings)
+
+    def compare(self, label, regular, fast, get_objects, context):
+        if not get_objects():
+            self.stdout.write(f'{label:<24} {"empty":<8}')
+            return True
+        expected, regular_time = self.render(regular, get_objects, context)
+        actual, fast_time = self.render(fast, get_objects, context)
+        #  Одиночный объект идет мимо ListSerializer, сверяем отдельно.
+        single_expected, _ = self.render(
+            regular, get_objects, context, many=False
+        )
+        single_actual, _ = self.render(
+            fast, get_objects, context, many=False
+        )
+        matches = expected == actual and single_expected == single_actual
+        self.stdout.write(
+            f'{label:<24} {"ok" if matches else "DIFFERS":<8} '
+            f'{regular_time:>9.2f} {fast_time:>9.2f} '
+            f'{regular_time / max(fast_time, 1e-6):>7.1f}x'
+        )
+        if not matches:
+            if expected == actual:
+                expected, actual = single_expected, single_actual
+            self.show_difference(expected, actual)
+        return matches
+
+    def show_difference(self, expected, actual):
+        start = next(
+            (
+                index for index, (left, right)
+                in enumerate(zip(expected, actual)) if left != right
+            ),
+            min(len(expected), len(actual))
+        )
+        start = max(start - 60, 0)
+        for name, payload in (('drf', expected), ('fast', actual)):
+            part = payload[start:start + 160].decode(errors='replace')
+            self.stdout.write(self.style.ERROR(f'  {name:<5} ...{part}'))
@@ -0,0 +1,115 @@
+from api.autocomplete import AUTOCOMPLETE_LIMIT
+from api.pagination import PageSizePagination
+from api.views import RecipeViewSet
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from recipe.models import Ingredients, Recipe, Tags
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.models import User
+from users.views import UserViewSet
+
+
+class Command(BaseCommand):
+    """Manage command printing query plans of API endpoints."""
+
+    help = (
+        'Prints EXPLAIN for queries behind every recipe list filter, '
+        'subscriptions and ingredient search, to verify index use.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Email of user whose favorites, shopcart and '
+                 'subscriptions are explained, first user by default.'
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run EXPLAIN ANALYZE, PostgreSQL only.'
+        )
+
+    def handle(self, *args, **options):
+        if options['analyze'] and connection.vendor != 'postgresql':
+            raise CommandError('--analyze is supported on PostgreSQL only.')
+        self.explain_options = {'analyze': True} if options['analyze'] else {}
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f'User {options["user"]} not found.')
+        else:
+            user = User.objects.order_by('id').first()
+        self.factory = APIRequestFactory()
+        page_size = PageSizePagination.page_size
+        for label, params in self.get_recipe_filters(user):
+            view = self.get_view(RecipeViewSet, 'list', params, user)
+            queryset = view.filter_queryset(view.get_queryset())
+            self.explain(label, queryset[:page_size])
+        recipes = self.get_view(RecipeViewSet, 'list', {}, user).get_queryset()
+        first = Recipe.objects.order_by('name', 'id').first()
+        if first is not None:
+            self.explain(
+                'recipes, cursor page',
+                recipes.order_by('name', 'id').filter(
+                    name__gt=first.name
+                )[:page_size]
+            )
+            self.explain('recipe detail', recipes.filter(pk=first.pk))
+        if user is not None:
+            self.explain(
+                'subscriptions',
+                self.get_view(
+                    UserViewSet, 'subscriptions', {}, user
+                ).get_subscriptions_queryset()[:page_size]
+            )
+        prefix = 'сах'
+        self.explain(
+            f'ingredients, name={prefix}',
+            Ingredients.objects.filter(
+                search_name__startswith=prefix
+            ).order_by('search_name', 'id')[:AUTOCOMPLETE_LIMIT]
+        )
+
+    def get_recipe_filters(self, user):
+        tags = list(Tags.objects.values_list('slug', flat=True)[:2])
+        author = Recipe.objects.values_list('author_id', flat=True).first()
+        filters = [
+            ('recipes', {}),
+            ('recipes, one tag', {'tags': tags[:1]}),
+            ('recipes, two tags', {'tags': tags}),
+            ('recipes, all of two tags', {'tags': tags, 'tags_mode': 'all'}),
+            ('recipes, search', {'search': 'суп курица'}),
+        ]
+        if author is not None:
+            filters += [
+                ('recipes, author', {'author': author}),
+                ('recipes, author and tags', {'author': author, 'tags': tags}),
+            ]
+        if user is not None:
+            filters += [
+                ('recipes, is_favorited', {'is_favorited': 1}),
+                ('recipes, is_in_shopping_cart', {'is_in_shopping_cart': 1}),
+                (
+                    'recipes, is_favorited and tags',
+                    {'is_favorited': 1, 'tags': tags}
+                ),
+            ]
+        return filters
+
+    def get_view(self, viewset, action, params, user):
+        """Viewset instance set up as if it was handling a request."""
+        request = self.factory.get('/', params)
+        if user is not None:
+            force_authenticate(request, user)
+        view = viewset(
+            action_map={'get': action}, args=(), kwargs={},
+            format_kwarg=None
+        )
+        view.request = view.initialize_request(request)
+        return view
+
+    def explain(self, label, queryset):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'-- {label}'))
+        self.stdout.write(str(queryset.query))
+        self.stdout.write(queryset.explain(**self.explain_options))
+        self.stdout.write('')
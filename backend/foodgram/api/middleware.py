@@ -0,0 +1,74 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses responses with brotli or gzip.
+
+    Brotli is chosen for JSON responses of the API when the brotli
+    package is installed and the client accepts it, gzip otherwise.
+    Bodies shorter than COMPRESSION_MIN_SIZE are sent as is, streamed
+    ones only with gzip.
+    """
+
+    def process_response(self, request, response):
+        if not response.streaming and (
+            len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        if (
+            response.streaming
+            or not self.accepts_brotli(request)
+            or not self.allows_brotli(request, response)
+        ):
+            return super().process_response(request, response)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.has_header('Content-Encoding'):
+            return response
+        compressed = brotli.compress(
+            response.content,
+            quality=settings.COMPRESSION_BROTLI_QUALITY
+        )
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        #  Как и в GZipMiddleware: сжатое тело уже не совпадает байт в
+        #  байт, сильный ETag становится слабым.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+    def accepts_brotli(self, request):
+        return (
+            brotli is not None
+            and settings.COMPRESSION_BROTLI
+            and re_accepts_brotli.search(
+                request.META.get('HTTP_ACCEPT_ENCODING', '')
+            ) is not None
+        )
+
+    def allows_brotli(self, request, response):
+        #  У brotli нет случайной добавки против BREACH, как у gzip в
+        #  Django: только JSON API, без CSRF-токенов в теле.
+        return (
+            request.path.startswith('/api/')
+            and response.get('Content-Type', '').startswith(
+                'application/json'
+            )
+            and not request.META.get('CSRF_COOKIE_USED')
+        )
@@ -1,4 +1,13 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+import operator
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class PageSizePagination(PageNumberPagination):
@@ -7,3 +16,165 @@ class PageSizePagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'limit'
     max_page_size = 100
+
+
+class CursorPageSizePagination(CursorPagination):
+    """
+    Keyset pagination for infinite scroll.
+
+    The cursor keeps values of every ordering field of the last item,
+    and the next page starts right after them, so there is no OFFSET
+    scan and no COUNT(*) however deep the client goes. Orderings end
+    with the unique id, so positions never repeat.
+
+    Search results are paged in ordering of the view, not by rank.
+    """
+
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        #  Явно запрошенная сортировка (?ordering=) важнее ключа вида.
+        for backend in getattr(view, 'filter_backends', ()):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return tuple(ordering)
+        return self.get_default_ordering(view)
+
+    def get_default_ordering(self, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering is None:
+            return (self.ordering,)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        #  Тот же CursorPagination.paginate_queryset, но позиция
+        #  составная: фильтр по всем полям сортировки, а не по первому.
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                order[1:] if order.startswith('-') else f'-{order}'
+                for order in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(
+                    queryset.model, current_position, reverse
+                )
+            )
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template:
+            self.display_page_controls = True
+        return self.page
+
+    def get_position_filter(self, model, position, reverse):
+        """
+        Rows following position in current ordering.
+
+        For ordering (a, -b) that is a > x or a = x and b < y.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        #  Курсор от другой сортировки (сменили ?ordering=).
+        if not isinstance(values, list) or len(values) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        conditions = []
+        equal = {}
+        for order, value in zip(self.ordering, values):
+            field = order.lstrip('-')
+            value = self.get_position_value(model, field, value)
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            conditions.append(Q(**equal, **{f'{field}__{lookup}': value}))
+            equal[field] = value
+        return reduce(operator.or_, conditions)
+
+    def get_position_value(self, model, field, value):
+        #  Курсор приходит от клиента: только скаляры нужного типа.
+        if not isinstance(value, (str, int, float)) or isinstance(
+            value, bool
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return model._meta.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            return value
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(instance[field])
+            else:
+                values.append(getattr(instance, field))
+        return json.dumps(values, cls=DjangoJSONEncoder)
+
+
+class FeedPagination(CursorPageSizePagination):
+    """Keyset pagination of the feed, newest recipes first."""
+
+    ordering = '-id'
+
+    def get_default_ordering(self, view):
+        return (self.ordering,)
+
+
+class CursorPaginationMixin:
+    """
+    Switches view to cursor pagination when ?cursor= is passed.
+
+    An empty cursor starts from the first page, following pages come
+    from next/previous links which keep all other query parameters.
+    """
+
+    cursor_pagination_class = CursorPageSizePagination
+    cursor_ordering = ('id',)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            cursor_query_param = (
+                self.cursor_pagination_class.cursor_query_param
+            )
+            if cursor_query_param in self.request.query_params:
+                pagination_class = self.cursor_pagination_class
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
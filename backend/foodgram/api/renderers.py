@@ -0,0 +1,66 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+#  Как и JSONRenderer, экранируем разделители строк для вставки в JS.
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson.
+
+    Output is the same compact UTF-8 JSON as of JSONRenderer. Requests
+    asking for indentation and setups without orjson installed are
+    served by JSONRenderer itself.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(
+            accepted_media_type or '', renderer_context or {}
+        ) is not None:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if data is None:
+            return b''
+        #  Decimal, ленивые строки и прочее, чего orjson не знает.
+        ret = orjson.dumps(
+            data,
+            default=JSONEncoder().default,
+            option=orjson.OPT_NON_STR_KEYS
+        )
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    """JSON parser backed by orjson, JSONParser when it is missing."""
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                content = content.decode(encoding)
+            return orjson.loads(content)
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise ParseError(f'JSON parse error - {exc}')
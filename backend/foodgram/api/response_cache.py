@@ -0,0 +1,87 @@
+import hashlib
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from api.renderers import ORJSONRenderer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+VERSION_KEY = 'recipe-responses-version'
+#  Порядок значений этих параметров не влияет на выдачу.
+UNORDERED_PARAMS = ('tags',)
+
+
+def get_responses_version():
+    """
+    Returns token that changes every time any recipe changes.
+
+    A fresh random token is issued when the old one is missing, so an
+    evicted version never brings back responses cached before it.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_recipe_responses():
+    """Drops every cached recipe response."""
+    cache.delete(VERSION_KEY)
+
+
+def invalidate_on_commit():
+    #  Раньше коммита нельзя: параллельный запрос закэширует старые
+    #  данные уже под новой версией.
+    transaction.on_commit(invalidate_recipe_responses)
+
+
+def normalize_query(query_params):
+    """
+    Query string with sorted parameters, so `?tags=b&tags=a&limit=6`
+    and `?limit=6&tags=a&tags=b` share one cache entry.
+
+    Empty values are kept: `?cursor=` is answered differently from a
+    request without cursor.
+    """
+    params = []
+    for name in sorted(query_params):
+        values = query_params.getlist(name)
+        if name in UNORDERED_PARAMS:
+            values = sorted(set(values))
+        params += [(name, value) for value in values]
+    return urlencode(params)
+
+
+def get_response_key(request, version):
+    #  Ссылки на страницы и картинки абсолютные, хост входит в ключ.
+    url = (
+        f'{request.scheme}://{request.get_host()}{request.path}'
+        f'?{normalize_query(request.query_params)}'
+    )
+    digest = hashlib.sha1(url.encode()).hexdigest()
+    return f'recipe-response:{version}:{digest}'
+
+
+def get_cached_response(request, build):
+    """
+    Returns cached response entry for request, building it on a miss.
+
+    build returns serialized data and its last modification timestamp.
+    The entry also keeps ETag, a digest of data rendered as JSON, so
+    an unchanged response revalidates even after it is rebuilt.
+    """
+    key = get_response_key(request, get_responses_version())
+    entry = cache.get(key)
+    if entry is None:
+        data, last_modified = build()
+        digest = hashlib.md5(ORJSONRenderer().render(data)).hexdigest()
+        entry = {
+            'data': data,
+            'etag': f'"{digest}"',
+            'last_modified': last_modified,
+        }
+        cache.set(key, entry, settings.RECIPE_CACHE_TIMEOUT)
+    return entry
@@ -1,28 +1,103 @@
 import base64
+import binascii
+from collections import OrderedDict
+from tempfile import SpooledTemporaryFile
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
+from django.core.files.base import File
 from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils.encoding import smart_str
+from recipe.catalog import resolve_ingredients, resolve_tags
+from recipe.images import schedule_variants, variant_urls
 from recipe.models import (
     Favorite, Ingredients, Recipe, RecipeIngredients,
     RecipeTags, Tags, ShopCart
 )
+from recipe.search import update_search_index
 from rest_framework import serializers
 from users.serializers import CustomUserSerializer
-from api.utils import create_ingredients, create_tags
+from api.fragments import get_fragments
+from api.shopping_list import invalidate_recipe_shopping_lists
+from api.utils import (
+    create_ingredients, create_tags, update_ingredients, update_tags
+)
 
 
 MIN_VALUE = 1
 
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Image field accepting data URLs.
+
+    The payload is decoded chunk by chunk into a spooled temporary
+    file, so a large upload is not held in memory twice, and anything
+    over IMAGE_UPLOAD_MAX_SIZE is rejected before decoding.
+    """
+
+    default_error_messages = {
+        'max_size': 'Image must not be larger than {max_size} bytes.',
+        'invalid_base64': 'Image is not valid base64.',
+    }
+    #  Кратно 4, чтобы куски base64 декодировались независимо.
+    CHUNK_SIZE = 64 * 1024
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(data)
         return super().to_internal_value(data)
 
+    def decode(self, data):
+        try:
+            format, imgstr = data.split(';base64,', 1)
+        except ValueError:
+            self.fail('invalid_base64')
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        if len(imgstr) // 4 * 3 > max_size + 2:
+            self.fail('max_size', max_size=max_size)
+        ext = format.split('/')[-1]
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        try:
+            for start in range(0, len(imgstr), self.CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    imgstr[start:start + self.CHUNK_SIZE],
+                    validate=True
+                ))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        if file.tell() > max_size:
+            file.close()
+            self.fail('max_size', max_size=max_size)
+        file.seek(0)
+        return File(file, name='temp.' + ext)
+
+
+class CachedTagField(serializers.SlugRelatedField):
+    """Tag id field resolved through the tag catalog cache."""
+
+    def to_internal_value(self, data):
+        #  Пакетная загрузка заранее кладет все теги в контекст.
+        tags = self.context.get('tags')
+        try:
+            tag_id = int(data)
+            if tags is None:
+                tags = resolve_tags([tag_id])
+            return tags[tag_id]
+        except KeyError:
+            self.fail(
+                'does_not_exist',
+                slug_name=self.slug_field,
+                value=smart_str(data)
+            )
+        except (TypeError, ValueError):
+            self.fail('invalid')
+
 
 class SubscriptionSerializer(serializers.Serializer):
     """Abstract model for serializers that do subscriptions."""
@@ -112,122 +187,176 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         return obj.ingredient.measurement_unit
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    """Recipe serializer."""
+def prefetch_fragment_relations(recipes):
+    """Loads tags and ingredients of recipes, skipping loaded ones."""
+    prefetch_related_objects(
+        recipes,
+        Prefetch(
+            'recipe_with_ingredient',
+            queryset=RecipeIngredients.objects.select_related(
+                'ingredient'
+            ).order_by('id')
+        ),
+        'tags'
+    )
+
+
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """
+    Part of recipe representation shared by all users.
+
+    It is built without request, so image URLs stay relative and the
+    result can be cached for any host.
+    """
 
     tags = TagSerializer(many=True)
     ingredients = IngredientRecipeSerializer(
         source='recipe_with_ingredient',
         many=True
     )
-    author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField(required=True, allow_null=True)
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = [
             'id',
             'tags',
-            'author',
             'ingredients',
-            'is_favorited',
-            'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
-            'cooking_time'
+            'cooking_time',
         ]
 
-    def get_is_in_shopping_cart(self, obj):
-        try:
-            request = self.context.get('request')
-            user = request.user.id
-            return ShopCart.objects.filter(
-                user=user,
-                recipe_id=obj.id
-            ).exists()
-        #  Как и просил, обработал именно по частному случаю
-        #  При создании рецепта прилетает ошибка KeyError: 'request'
-        #  Либо, если через get(), то attirubute error.
-        #  Потому что никакого request то не было, мы создавали рецепт
-        #  Сделал через get() и часнтный случай, который не влияет
-        #  на функциональность обработал.
-        except AttributeError:
-            return False
-
-    def get_is_favorited(self, obj):
-        try:
-            request = self.context.get('request')
-            user = request.user.id
-            return Favorite.objects.filter(
-                user=user,
-                recipe_id=obj.id
-            ).exists()
-        except AttributeError:
-            return False
+    def get_image_variants(self, obj):
+        return variant_urls(obj)
 
 
-class RecipeShopcartSerializer(serializers.ModelSerializer):
-    """Shopcart serializer."""
+class BatchListSerializer(serializers.ListSerializer):
+    """Passes the whole page to child.represent for batched lookups."""
 
-    class Meta:
-        #  Модели сделал в соответствии с сериализатором. Я понял про твои
-        #  два метода, здесь действительно следующие 40 строчек кода абсолютно
-        #  одинаковые, изначально я и пытался этот момент решить через
-        #  наследование, не додумавшись до миксина. Из-за того что дедлайн
-        #  горит, я сделал как проще но хуже). Потом доработаю этот участок
-        #  через миксин, либо через отдельный класс, который заберет и логику
-        #  из views.py.
-        model = ShopCart
-        fields = ['id']
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        return self.child.represent(list(data))
 
-    def validate(self, data):
-        """Checks if this item is already created."""
-        recipe = self.instance
-        user = self.context.get('request').user.id
-        if ShopCart.objects.filter(
-            user_id=user,
-            recipe_id=recipe.id
-        ).exists():
-            raise ValidationError('Item already in shopcart.')
-        return data
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation['id'] = instance.id
-        representation['name'] = instance.name
-        representation['image'] = instance.image.url
-        representation['cooking_time'] = instance.cooking_time
-        return representation
+class RecipeSerializer(RecipeFragmentSerializer):
+    """
+    Recipe serializer.
 
+    Shared part comes from the fragment cache, author, counters and
+    flags of current user are added on top of it.
+    """
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Favorite serializer."""
+    author = CustomUserSerializer(read_only=True)
+    image = Base64ImageField(required=True, allow_null=True)
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
 
     class Meta:
-        model = Favorite
-        fields = ['id']
-
-    def validate(self, data):
-        """Checks if this item is already created."""
-        recipe = self.instance
-        user = self.context.get('request').user.id
-        if Favorite.objects.filter(
-            user_id=user,
-            recipe_id=recipe.id
-        ).exists():
-            raise ValidationError('This recipe is already favorite.')
-        return data
+        model = Recipe
+        fields = [
+            'id',
+            'tags',
+            'author',
+            'ingredients',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'name',
+            'image',
+            'image_variants',
+            'text',
+            'cooking_time',
+            'favorites_count'
+        ]
+        list_serializer_class = BatchListSerializer
 
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation['id'] = instance.id
-        representation['name'] = instance.name
-        representation['image'] = instance.image.url
-        representation['cooking_time'] = instance.cooking_time
-        return representation
+        return self.represent([instance])[0]
+
+    def build_fragments(self, recipes):
+        prefetch_fragment_relations(recipes)
+        return self.serialize_fragments(recipes)
+
+    def serialize_fragments(self, recipes):
+        return RecipeFragmentSerializer(recipes, many=True).data
+
+    def serialize_author(self, author):
+        return CustomUserSerializer(author, context=self.context).data
+
+    def get_user_flags(self, recipes):
+        """
+        is_favorited and is_in_shopping_cart by recipe id.
+
+        Flags annotated by RecipeViewSet.get_queryset are taken as is,
+        otherwise they are looked up with one query for all recipes.
+        """
+        if all(
+            hasattr(recipe, 'is_favorited')
+            and hasattr(recipe, 'is_in_shopping_cart')
+            for recipe in recipes
+        ):
+            return {
+                recipe.id: (recipe.is_favorited, recipe.is_in_shopping_cart)
+                for recipe in recipes
+            }
+        ids = [recipe.id for recipe in recipes]
+        user = getattr(self.context.get('request'), 'user', None)
+        if user is None or not user.is_authenticated:
+            return {id: (False, False) for id in ids}
+        favorited = set(Favorite.objects.filter(
+            user=user,
+            recipe_id__in=ids
+        ).values_list('recipe_id', flat=True))
+        in_shopping_cart = set(ShopCart.objects.filter(
+            user=user,
+            recipe_id__in=ids
+        ).values_list('recipe_id', flat=True))
+        return {
+            id: (id in favorited, id in in_shopping_cart) for id in ids
+        }
+
+    def represent(self, recipes):
+        request = self.context.get('request')
+        #  Схема и хост вычисляются один раз на страницу.
+        host = request.build_absolute_uri('/')[:-1] if request else None
+
+        def absolute(url):
+            if request is None or not url:
+                return url
+            if url.startswith('/') and not url.startswith('//'):
+                return host + url
+            return request.build_absolute_uri(url)
+
+        fragments = get_fragments(recipes, self.build_fragments)
+        flags = self.get_user_flags(recipes)
+        authors = {}
+        data = []
+        for recipe, fragment in zip(recipes, fragments):
+            #  Автор сериализуется один раз на страницу.
+            if recipe.author_id not in authors:
+                authors[recipe.author_id] = self.serialize_author(
+                    recipe.author
+                )
+            is_favorited, is_in_shopping_cart = flags[recipe.id]
+            values = dict(
+                fragment,
+                author=authors[recipe.author_id],
+                is_favorited=is_favorited,
+                is_in_shopping_cart=is_in_shopping_cart,
+                image=absolute(fragment['image']),
+                image_variants={
+                    variant: absolute(url)
+                    for variant, url in fragment['image_variants'].items()
+                },
+                favorites_count=recipe.favorites_count
+            )
+            data.append(OrderedDict(
+                (field, values[field]) for field in self.Meta.fields
+            ))
+        return data
 
 
 class RecipeCreationSerializer(serializers.ModelSerializer):
@@ -236,7 +365,7 @@ class RecipeCreationSerializer(serializers.ModelSerializer):
     ingredients = IngredientSerializer(
         many=True
     )
-    tags = serializers.SlugRelatedField(
+    tags = CachedTagField(
         queryset=Tags.objects.all(),
         many=True,
         slug_field='id'
@@ -254,6 +383,26 @@ class RecipeCreationSerializer(serializers.ModelSerializer):
             'cooking_time',
         ]
 
+    def validate_ingredients(self, value):
+        """Checks ingredients against the cached catalog."""
+        ids = [ingredient['id'] for ingredient in value]
+        found = self.context.get('ingredients')
+        if found is None:
+            found = resolve_ingredients(ids)
+        missing = [str(id) for id in ids if id not in found]
+        if missing:
+            raise ValidationError(
+                f'Ingredients do not exist: {", ".join(missing)}.'
+            )
+        if len(set(ids)) != len(ids):
+            raise ValidationError('Ingredients must not repeat.')
+        return value
+
+    def validate_tags(self, value):
+        if len(set(value)) != len(value):
+            raise ValidationError('Tags must not repeat.')
+        return value
+
     def to_representation(self, value):
         serializer = RecipeSerializer(value)
         return serializer.data
@@ -261,27 +410,48 @@ class RecipeCreationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(**validated_data)
+        recipe = Recipe.objects.create(
+            ingredients_count=len(ingredients),
+            **validated_data
+        )
         create_ingredients(RecipeIngredients, ingredients, recipe.id)
         create_tags(RecipeTags, tags, recipe.id)
+        update_search_index([recipe.id])
+        schedule_variants(recipe)
         return recipe
 
     def update(self, instance, validated_data):
-        new_ingredients = validated_data.pop('ingredients')
-        new_tags = validated_data.pop('tags')
-
-        instance.image = validated_data.get('image', instance.image)
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time',
-            instance.cooking_time
-        )
-        instance.tags.set(new_tags)
-        instance.save()
-        recipe = self.data['id']
-        RecipeIngredients.objects.filter(recipe_id=self.data['id']).delete()
-        RecipeTags.objects.filter(recipe_id=self.data['id']).delete()
-        create_ingredients(RecipeIngredients, new_ingredients, recipe)
-        create_tags(RecipeTags, new_tags, recipe)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if 'image' in validated_data:
+            image = validated_data['image']
+            stored_image = instance.image.name
+            if image is None:
+                instance.image = None
+            else:
+                #  Та же картинка получает то же имя, готовые варианты
+                #  остаются.
+                instance.image.save(image.name, image, save=False)
+            if instance.image.name != stored_image:
+                instance.image_variants = {}
+        for field in ('name', 'text', 'cooking_time'):
+            if field in validated_data:
+                setattr(instance, field, validated_data[field])
+        with transaction.atomic():
+            if ingredients is not None:
+                instance.ingredients_count = len(ingredients)
+            instance.save()
+            if tags is not None:
+                update_tags(RecipeTags, tags, instance.id)
+            if ingredients is not None and update_ingredients(
+                RecipeIngredients, ingredients, instance.id
+            ):
+                #  bulk-операции не отправляют сигналы, кэш списков
+                #  покупок сбрасываем сами, когда изменения видны всем.
+                transaction.on_commit(
+                    lambda: invalidate_recipe_shopping_lists([instance.id])
+                )
+            update_search_index([instance.id])
+            if not instance.image_variants:
+                schedule_variants(instance)
         return instance
@@ -0,0 +1,108 @@
+from typing import NamedTuple
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db.models import Sum
+from recipe.catalog import resolve_ingredients
+from recipe.models import RecipeIngredients, ShopCart
+
+
+DOCUMENT_TIMEOUT = 60 * 60 * 24
+
+
+class ShoppingListItem(NamedTuple):
+    """Single line of the shopping list."""
+
+    name: str
+    amount: int
+    measurement_unit: str
+
+
+def get_shopping_list(user):
+    """
+    Collects ingredients from every recipe in user's shopcart.
+
+    Amounts are summed in one grouped query, so the cost does not
+    depend on the number of recipes in the shopcart. Names and units
+    come from the cached ingredient catalog. The result is a plain
+    list shared by every export format.
+    """
+    totals = dict(RecipeIngredients.objects.filter(
+        recipe__shopcart__user=user
+    ).values('ingredient_id').annotate(
+        total=Sum('amount')
+    ).values_list('ingredient_id', 'total'))
+    catalog = resolve_ingredients(totals)
+    items = [
+        ShoppingListItem(
+            catalog[ingredient_id].name,
+            total,
+            catalog[ingredient_id].measurement_unit
+        )
+        for ingredient_id, total in totals.items()
+    ]
+    items.sort(key=lambda item: (item.name, item.measurement_unit))
+    return items
+
+
+def get_version_key(user_id):
+    return f'shopping-list-version:{user_id}'
+
+
+def get_cart_version(user_id):
+    """
+    Returns token that changes every time user's shopcart changes.
+
+    A fresh random token is issued when the old one is missing, so an
+    evicted version never brings back documents rendered before it.
+    """
+    key = get_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_shopping_lists(user_ids):
+    """Drops cached shopping lists of given users."""
+    cache.delete_many([get_version_key(user_id) for user_id in user_ids])
+
+
+def invalidate_recipe_shopping_lists(recipe_ids):
+    """Drops cached shopping lists of users having recipes in shopcart."""
+    invalidate_shopping_lists(ShopCart.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('user_id', flat=True).distinct())
+
+
+def get_etag(version, exporter):
+    return f'"{version}-{exporter.format}"'
+
+
+def cache_chunks(key, chunks):
+    """Passes rendered chunks through and caches the whole document."""
+    document = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        document.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(document), DOCUMENT_TIMEOUT)
+
+
+def get_document(user_id, version, exporter):
+    """
+    Returns shopping list document as an iterable of chunks.
+
+    Cached document is returned as is, otherwise it is rendered while
+    being streamed and stored for the next download.
+    """
+    key = f'shopping-list:{user_id}:{version}:{exporter.format}'
+    document = cache.get(key)
+    if document is not None:
+        return [document]
+    return cache_chunks(
+        key,
+        exporter.render(get_shopping_list(user_id))
+    )
@@ -0,0 +1,79 @@
+from api.response_cache import invalidate_on_commit
+from api.shopping_list import (
+    invalidate_recipe_shopping_lists, invalidate_shopping_lists
+)
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from recipe.models import (
+    Ingredients, Recipe, RecipeIngredients, RecipeTags, ShopCart, Tags,
+    recipes_changed
+)
+
+
+@receiver([post_save, post_delete], sender=ShopCart)
+def shopcart_changed(sender, instance, **kwargs):
+    """Shopcart content has changed."""
+    #  Как и для ответов: до коммита параллельный запрос закэширует
+    #  старый список уже под новой версией.
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_shopping_lists([user_id]))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeIngredients)
+@receiver([post_save, post_delete], sender=RecipeTags)
+def recipe_changed(sender, **kwargs):
+    """Recipe responses cached for anonymous users are outdated."""
+    invalidate_on_commit()
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredients)
+@receiver([post_save, post_delete], sender=RecipeTags)
+def recipe_relation_changed(sender, instance, **kwargs):
+    """Cached fragment of the recipe is outdated."""
+    #  Ключ фрагмента меняется вместе с updated_at. Сюда приходят и
+    #  связи, удаленные каскадом вместе с тегом или ингредиентом.
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredients)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    """Shopping lists with this recipe are outdated."""
+    recipe_ids = [instance.recipe_id]
+    transaction.on_commit(
+        lambda: invalidate_recipe_shopping_lists(recipe_ids)
+    )
+
+
+@receiver(recipes_changed)
+def recipes_updated(sender, recipe_ids, ingredients=False, **kwargs):
+    """Recipes were changed bypassing model signals."""
+    invalidate_on_commit()
+    if ingredients:
+        recipe_ids = list(recipe_ids)
+        transaction.on_commit(
+            lambda: invalidate_recipe_shopping_lists(recipe_ids)
+        )
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(post_save, sender=Tags)
+def catalog_renamed(sender, instance, created, **kwargs):
+    """Names shown inside recipes and shopping lists have changed."""
+    if created:
+        return
+    if sender is Tags:
+        recipes = Recipe.objects.filter(tags=instance)
+    else:
+        recipes = Recipe.objects.filter(ingredients=instance)
+        #  Название и единица попадают в готовые списки покупок.
+        recipe_ids = list(recipes.values_list('id', flat=True).distinct())
+        transaction.on_commit(
+            lambda: invalidate_recipe_shopping_lists(recipe_ids)
+        )
+    recipes.update(updated_at=timezone.now())
+    invalidate_on_commit()
@@ -0,0 +1,617 @@
+import json
+import shutil
+import tempfile
+from base64 import b64encode
+from io import BytesIO
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+
+from api import middleware
+from api.exporters import TITLE
+from api.management.commands.benchmark_api import QUERY_BUDGETS
+from api.response_cache import normalize_query
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.http import HttpResponse, QueryDict
+from django.test import override_settings
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipe.catalog import ingredients_cache, tags_cache
+from recipe.models import (
+    Favorite, Ingredients, Recipe, RecipeIngredients, RecipeTags, ShopCart,
+    Tags
+)
+from recipe.search import update_search_index
+from rest_framework.test import APITestCase
+from users.models import Follow, User
+
+
+def create_recipes(number=6):
+    """Users, catalog and recipes with every relation filled."""
+    users = [
+        User.objects.create_user(
+            email=f'user{index}@foodgram.ru',
+            username=f'user{index}',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password'
+        )
+        for index in range(3)
+    ]
+    tags = [
+        Tags.objects.create(name=slug, slug=slug, color='#E26C2D')
+        for slug in ('breakfast', 'lunch', 'dinner')
+    ]
+    ingredients = [
+        Ingredients.objects.create(name=f'Ингредиент {index}',
+                                   measurement_unit='г')
+        for index in range(4)
+    ]
+    recipes = []
+    for index in range(number):
+        recipe = Recipe.objects.create(
+            author=users[index % len(users)],
+            name=f'Рецепт {index}',
+            image='images/recipe.png',
+            text='Описание рецепта.',
+            cooking_time=10
+        )
+        recipe.tags.set(tags[:index % len(tags) + 1])
+        for ingredient in ingredients[:index % len(ingredients) + 1]:
+            RecipeIngredients.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+        recipes.append(recipe)
+    Follow.objects.create(user=users[0], author=users[1])
+    Favorite.objects.create(user=users[0], recipe=recipes[1])
+    ShopCart.objects.create(user=users[0], recipe=recipes[1])
+    return users, recipes
+
+
+class ResponseCacheTests(APITestCase):
+    """Cache of recipe responses served to anonymous users."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_query_order_does_not_matter(self):
+        self.assertEqual(
+            normalize_query(QueryDict('tags=b&limit=6&tags=a')),
+            normalize_query(QueryDict('limit=6&tags=a&tags=b&tags=a'))
+        )
+
+    def test_empty_values_are_kept(self):
+        self.assertNotEqual(
+            normalize_query(QueryDict('cursor=')),
+            normalize_query(QueryDict(''))
+        )
+
+    def test_empty_cursor_is_cached_separately(self):
+        pages = self.client.get('/api/recipes/')
+        cursor = self.client.get('/api/recipes/?cursor=')
+        self.assertIn('count', pages.data)
+        self.assertNotIn('count', cursor.data)
+
+
+class RecipeQueriesTests(APITestCase):
+    """Recipe pages take the same number of queries for any size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.recipes = create_recipes()
+
+    def setUp(self):
+        cache.clear()
+        #  В тестах on_commit не срабатывает, каталог мог остаться от
+        #  данных другого теста.
+        tags_cache.invalidate()
+        ingredients_cache.invalidate()
+
+    def assert_queries(self, url, number, user=None):
+        self.client.force_authenticate(user)
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(
+                FAST_SERIALIZERS=fast
+            ):
+                #  Первый запрос загружает каталог в память процесса,
+                #  фрагменты и ответы второй собирает заново.
+                self.client.get(url)
+                cache.clear()
+                with self.assertNumQueries(number):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_list_anonymous(self):
+        #  Анониму не нужны флаги избранного и корзины.
+        self.assert_queries('/api/recipes/?limit=6', 4)
+
+    def test_list_signed_in(self):
+        self.assert_queries('/api/recipes/?limit=6', 5, self.users[0])
+
+    def test_detail_anonymous(self):
+        self.assert_queries(f'/api/recipes/{self.recipes[1].id}/', 3)
+
+    def test_detail_signed_in(self):
+        self.assert_queries(
+            f'/api/recipes/{self.recipes[1].id}/', 4, self.users[0]
+        )
+
+
+class FragmentCacheTests(APITestCase):
+    """Cached recipe fragments follow tags and ingredients."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.recipes = create_recipes()
+
+    def setUp(self):
+        cache.clear()
+        tags_cache.invalidate()
+        ingredients_cache.invalidate()
+        self.client.force_authenticate(self.users[0])
+        self.url = f'/api/recipes/{self.recipes[2].id}/'
+
+    def get_tags(self):
+        return [tag['id'] for tag in self.client.get(self.url).data['tags']]
+
+    def test_tag_deleted(self):
+        tag = self.recipes[2].tags.first()
+        tag_id = tag.id
+        self.assertIn(tag_id, self.get_tags())
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertNotIn(tag_id, self.get_tags())
+
+    def test_amount_changed(self):
+        self.client.get(self.url)
+        row = RecipeIngredients.objects.filter(
+            recipe=self.recipes[2]
+        ).first()
+        row.amount = 321
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        amounts = {
+            item['id']: item['amount']
+            for item in self.client.get(self.url).data['ingredients']
+        }
+        self.assertEqual(amounts[row.id], 321)
+
+
+def image_data_url(color):
+    buffer = BytesIO()
+    Image.new('RGB', (4, 4), color).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+class RecipeUpdateTests(APITestCase):
+    """Editing recipes through the API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.recipes = create_recipes(2)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        self.client.force_authenticate(self.users[0])
+        self.recipe = self.recipes[0]
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def patch(self, **data):
+        response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.recipe.refresh_from_db()
+        return response
+
+    def test_same_image_keeps_variants(self):
+        self.patch(image=image_data_url('red'))
+        variants = {'thumbnail': 'images/variants/thumbnail.webp'}
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image_variants=variants
+        )
+        self.patch(image=image_data_url('red'))
+        self.assertEqual(self.recipe.image_variants, variants)
+        self.patch(image=image_data_url('blue'))
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_unchanged_rows_keep_ids(self):
+        recipe = self.recipes[1]
+        self.client.force_authenticate(recipe.author)
+        self.url = f'/api/recipes/{recipe.id}/'
+        ingredients = {
+            row.ingredient_id: row
+            for row in RecipeIngredients.objects.filter(recipe=recipe)
+        }
+        tags = dict(RecipeTags.objects.filter(recipe=recipe).values_list(
+            'tag_id', 'id'
+        ))
+        kept, changed = ingredients
+        added = Ingredients.objects.exclude(id__in=ingredients).first()
+        self.patch(
+            ingredients=[
+                {'id': kept, 'amount': ingredients[kept].amount},
+                {'id': changed, 'amount': 7},
+                {'id': added.id, 'amount': 3},
+            ],
+            tags=list(tags)
+        )
+        rows = {
+            row.ingredient_id: row
+            for row in RecipeIngredients.objects.filter(recipe=recipe)
+        }
+        self.assertEqual(set(rows), {kept, changed, added.id})
+        self.assertEqual(rows[kept].id, ingredients[kept].id)
+        self.assertEqual(rows[changed].id, ingredients[changed].id)
+        self.assertEqual(rows[changed].amount, 7)
+        self.assertEqual(dict(RecipeTags.objects.filter(
+            recipe=recipe
+        ).values_list('tag_id', 'id')), tags)
+
+
+class BulkCreateTests(APITestCase):
+    """Creating many recipes in one request."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.recipes = create_recipes(2)
+        cls.ingredient = Ingredients.objects.first()
+        cls.tag = Tags.objects.first()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_authenticate(self.users[1])
+
+    def item(self, name, ingredient_id=None):
+        return {
+            'ingredients': [{
+                'id': ingredient_id or self.ingredient.id,
+                'amount': 10
+            }],
+            'tags': [self.tag.id],
+            'image': image_data_url('green'),
+            'name': name,
+            'text': 'Описание рецепта.',
+            'cooking_time': 15,
+        }
+
+    def post(self, items):
+        return self.client.post('/api/recipes/bulk/', items, format='json')
+
+    def test_partial_failure(self):
+        recipes = Recipe.objects.count()
+        response = self.post([
+            self.item('Первый'),
+            self.item('Второй', ingredient_id=-1),
+            self.item('Третий'),
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual(
+            [(result['index'], result['status']) for result in results],
+            [(0, 201), (1, 400), (2, 201)]
+        )
+        self.assertIn('ingredients', results[1]['errors'])
+        self.assertEqual(Recipe.objects.count(), recipes + 2)
+        self.assertFalse(Recipe.objects.filter(name='Второй').exists())
+        created = Recipe.objects.get(pk=results[0]['id'])
+        self.assertEqual(created.name, 'Первый')
+        self.assertEqual(
+            list(created.recipe_with_ingredient.values_list(
+                'ingredient_id', 'amount'
+            )),
+            [(self.ingredient.id, 10)]
+        )
+        self.assertEqual(list(created.tags.all()), [self.tag])
+        self.users[1].refresh_from_db()
+        self.assertEqual(self.users[1].recipes_count, 2)
+
+    def test_all_invalid(self):
+        recipes = Recipe.objects.count()
+        response = self.post([self.item('Рецепт', ingredient_id=-1)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Recipe.objects.count(), recipes)
+
+    def test_not_a_list(self):
+        self.assertEqual(self.post(self.item('Рецепт')).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+
+
+class QueryBudgetTests(APITestCase):
+    """Endpoints stay within budgets checked by benchmark_api."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.recipes = create_recipes()
+
+    def setUp(self):
+        cache.clear()
+        tags_cache.invalidate()
+        ingredients_cache.invalidate()
+        self.client.force_authenticate(self.users[0])
+
+    def test_budgets(self):
+        urls = {
+            'recipes': '/api/recipes/?limit=6&page=1',
+            'recipe': f'/api/recipes/{self.recipes[1].id}/',
+            'subscriptions': (
+                '/api/users/subscriptions/?limit=6&recipes_limit=3'
+            ),
+            'ingredients': '/api/ingredients/?name=инг',
+            'shopping_cart': '/api/recipes/download_shopping_cart/',
+        }
+        self.assertEqual(set(urls), set(QUERY_BUDGETS))
+        for name, url in urls.items():
+            with self.subTest(name):
+                #  Как и benchmark_api, меряем второй запрос.
+                self.client.get(url)
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(url)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(
+                    len(context.captured_queries), QUERY_BUDGETS[name]
+                )
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+})
+class FastSerializerTests(APITestCase):
+    """Fast serializers give the same JSON as regular ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.recipes = create_recipes()
+
+    def get_content(self, url, fast):
+        with override_settings(FAST_SERIALIZERS=fast):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assert_parity(self, urls, user=None):
+        self.client.force_authenticate(user)
+        for url in urls:
+            with self.subTest(url=url, user=user):
+                self.assertEqual(
+                    self.get_content(url, fast=True),
+                    self.get_content(url, fast=False)
+                )
+
+    def test_anonymous(self):
+        self.assert_parity([
+            '/api/recipes/',
+            f'/api/recipes/{self.recipes[1].id}/',
+            '/api/users/',
+            '/api/tags/',
+            '/api/ingredients/',
+        ])
+
+    def test_signed_in(self):
+        #  Подписка на автора и флаги рецепта отличаются от анонимных.
+        self.assert_parity([
+            '/api/recipes/',
+            f'/api/recipes/{self.recipes[1].id}/',
+            '/api/users/',
+            f'/api/users/{self.users[1].id}/',
+            '/api/users/me/',
+        ], self.users[0])
+
+
+class ToggleRecipeTests(APITestCase):
+    """Adding recipes to favorites and shopcart."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.recipes = create_recipes(2)
+
+    def setUp(self):
+        self.client.force_authenticate(self.users[2])
+        self.url = f'/api/recipes/{self.recipes[0].id}/favorite/'
+
+    def test_twice(self):
+        self.assertEqual(self.client.post(self.url).status_code, 200)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.client.delete(self.url).status_code, 400)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].favorites_count, 0)
+
+    def test_missing_recipe(self):
+        self.assertEqual(
+            self.client.post('/api/recipes/0/favorite/').status_code, 404
+        )
+
+    def test_other_integrity_errors(self):
+        with mock.patch.object(
+            Favorite.objects, 'create', side_effect=IntegrityError
+        ), self.assertRaises(IntegrityError):
+            self.client.post(self.url)
+
+
+class CursorPaginationTests(APITestCase):
+    """Cursor pages follow the whole ordering, ties included."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, recipes = create_recipes(7)
+        #  Одинаковые имена и счетчики: первого поля курсору мало.
+        for index, recipe in enumerate(recipes):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                name=f'Рецепт {index % 2}',
+                favorites_count=index % 3
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url, key):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data[key]
+        return ids, response
+
+    def test_pages(self):
+        for ordering in ('', '&ordering=-favorites_count'):
+            with self.subTest(ordering=ordering):
+                expected = list(Recipe.objects.order_by(
+                    *(('-favorites_count', 'id') if ordering
+                      else ('name', 'id'))
+                ).values_list('id', flat=True))
+                forward, last = self.walk(
+                    f'/api/recipes/?cursor=&limit=2{ordering}', 'next'
+                )
+                self.assertEqual(forward, expected)
+                backward, _ = self.walk(last.data['previous'], 'previous')
+                #  Страницы назад идут с конца, внутри страницы порядок
+                #  прямой.
+                self.assertCountEqual(backward, expected[:-1])
+
+    def test_invalid_cursor(self):
+        for position in (
+            'x', '{}', '["x"]', '["x", {"a": 1}]', '["x", "y"]',
+            '[null, 1]', '[true, 1]',
+        ):
+            with self.subTest(position=position):
+                cursor = b64encode(
+                    urlencode({'p': position}).encode()
+                ).decode()
+                response = self.client.get(
+                    f'/api/recipes/?{urlencode({"cursor": cursor})}'
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 fallback')
+class SearchTests(APITestCase):
+    """Recipe search on SQLite."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, recipes = create_recipes(2)
+        cls.recipe = recipes[0]
+        cls.recipe.name = 'Running супы'
+        cls.recipe.save()
+        update_search_index([cls.recipe.id])
+
+    def search(self, query):
+        response = self.client.get(f'/api/recipes/?search={query}')
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_english_words_are_stemmed(self):
+        self.assertEqual(self.search('runs'), [self.recipe.id])
+
+    def test_russian_words_match_by_prefix(self):
+        self.assertEqual(self.search('суп'), [self.recipe.id])
+        self.assertEqual(self.search('супа'), [])
+
+
+class ShoppingListTests(APITestCase):
+    """Cached shopping lists follow recipe changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.recipes = create_recipes()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.users[0])
+
+    def download(self, export_format='txt'):
+        response = self.client.get(
+            f'/api/recipes/download_shopping_cart/?format={export_format}'
+        )
+        content = b''
+        if response.status_code == 200:
+            content = b''.join(response.streaming_content)
+        return response, content
+
+    def test_formats(self):
+        for export_format, content_type, start in (
+            ('txt', 'text/plain; charset=utf-8', TITLE.encode()),
+            ('csv', 'text/csv; charset=utf-8', b'name,amount'),
+            ('json', 'application/json', b'['),
+            ('pdf', 'application/pdf', b'%PDF'),
+        ):
+            with self.subTest(export_format):
+                response, content = self.download(export_format)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertIn(
+                    f'shopping_cart.{export_format}',
+                    response['Content-Disposition']
+                )
+                self.assertTrue(content.startswith(start), content[:40])
+        _, content = self.download('json')
+        self.assertEqual(
+            json.loads(content),
+            [
+                {'name': 'Ингредиент 0', 'amount': 100,
+                 'measurement_unit': 'г'},
+                {'name': 'Ингредиент 1', 'amount': 100,
+                 'measurement_unit': 'г'},
+            ]
+        )
+
+    def test_unknown_format(self):
+        response, _ = self.download('docx')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('errors', response.data)
+
+    def test_ingredient_amount_changed(self):
+        _, before = self.download()
+        row = RecipeIngredients.objects.filter(
+            recipe=self.recipes[1]
+        ).first()
+        row.amount = 321
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        _, after = self.download()
+        self.assertNotEqual(before, after)
+        self.assertIn(b'321', after)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200, COMPRESSION_BROTLI=True)
+@mock.patch.object(
+    middleware, 'brotli', mock.Mock(compress=lambda data, quality: b'br')
+)
+class CompressionTests(APITestCase):
+    """Response compression and its BREACH limits."""
+
+    def compress(self, path, body, content_type='application/json'):
+        request = RequestFactory().get(
+            path, HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        return middleware.CompressionMiddleware(
+            lambda request: HttpResponse(body, content_type=content_type)
+        )(request)
+
+    def test_below_threshold(self):
+        response = self.compress('/api/tags/', b'[]')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+
+    def test_html_is_not_brotli(self):
+        response = self.compress(
+            '/admin/', b'<p>text</p>' * 100, 'text/html'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_json(self):
+        response = self.compress('/api/tags/', b'[1, 2, 3]' * 100)
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
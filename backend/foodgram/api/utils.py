@@ -1,3 +1,18 @@
+from api.response_cache import invalidate_on_commit
+from django.db import transaction
+from django.db.models import F
+from recipe.feed import fan_out
+from recipe.images import schedule_variants
+from recipe.models import Recipe, RecipeIngredients, RecipeTags
+from recipe.search import update_search_index
+from users.models import User
+
+
+def change_counter(model, pk, field, delta):
+    """Adds delta to counter column in one UPDATE, without a race."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
 def create_ingredients(model, data, recipe):
     """Creating ingredients for given recipe."""
     creation_list = []
@@ -21,3 +36,109 @@ def create_tags(model, data, recipe):
             recipe_id=recipe
         ))
     model.objects.bulk_create(creation_list)
+
+
+def update_ingredients(model, data, recipe):
+    """
+    Brings ingredients of recipe to given list, touching only rows
+    that changed. Returns True if anything was changed.
+    """
+    current = {
+        row.ingredient_id: row
+        for row in model.objects.filter(recipe_id=recipe)
+    }
+    amounts = {
+        ingredient.get('id'): ingredient.get('amount')
+        for ingredient in data
+    }
+    creation_list = []
+    update_list = []
+    for ingredient_id, amount in amounts.items():
+        row = current.get(ingredient_id)
+        if row is None:
+            creation_list.append(model(
+                ingredient_id=ingredient_id,
+                recipe_id=recipe,
+                amount=amount
+            ))
+        elif row.amount != amount:
+            row.amount = amount
+            update_list.append(row)
+    removed = current.keys() - amounts.keys()
+    if removed:
+        model.objects.filter(
+            recipe_id=recipe,
+            ingredient_id__in=removed
+        ).delete()
+    model.objects.bulk_create(creation_list)
+    model.objects.bulk_update(update_list, ['amount'])
+    return bool(removed or creation_list or update_list)
+
+
+def update_tags(model, data, recipe):
+    """Brings tags of recipe to given list, touching only changes."""
+    current = set(
+        model.objects.filter(recipe_id=recipe).values_list(
+            'tag_id',
+            flat=True
+        )
+    )
+    new = {tag.id for tag in data}
+    if current - new:
+        model.objects.filter(
+            recipe_id=recipe,
+            tag_id__in=current - new
+        ).delete()
+    model.objects.bulk_create(
+        model(tag_id=tag_id, recipe_id=recipe) for tag_id in new - current
+    )
+
+
+@transaction.atomic
+def bulk_create_recipes(author, items, batch_size=500):
+    """
+    Creates recipes from validated serializer data in a few batched
+    INSERTs, returns them in the same order.
+    """
+    recipes = Recipe.objects.bulk_create(
+        [
+            Recipe(
+                author=author,
+                ingredients_count=len(item['ingredients']),
+                **{
+                    field: value for field, value in item.items()
+                    if field not in ('ingredients', 'tags')
+                }
+            )
+            for item in items
+        ],
+        batch_size=batch_size
+    )
+    RecipeIngredients.objects.bulk_create(
+        (
+            RecipeIngredients(
+                recipe_id=recipe.id,
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
+            )
+            for recipe, item in zip(recipes, items)
+            for ingredient in item['ingredients']
+        ),
+        batch_size=batch_size
+    )
+    RecipeTags.objects.bulk_create(
+        (
+            RecipeTags(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe, item in zip(recipes, items)
+            for tag in item['tags']
+        ),
+        batch_size=batch_size
+    )
+    change_counter(User, author.id, 'recipes_count', len(recipes))
+    update_search_index(recipe.id for recipe in recipes)
+    fan_out(recipes)
+    #  bulk_create не отправляет сигналы.
+    invalidate_on_commit()
+    for recipe in recipes:
+        schedule_variants(recipe)
+    return recipes
@@ -1,193 +1,471 @@
-from io import BytesIO
-
+from api.autocomplete import search_ingredients
+from api.exporters import (
+    DEFAULT_FORMAT, EXPORTERS, ExportContentNegotiation
+)
+from api.fast_serializers import (
+    FastIngredientSerializer, FastRecipeSerializer, FastSerializerMixin,
+    FastTagSerializer
+)
+from api.filters import RecipeFilter, RecipeOrderingFilter
+from api.pagination import CursorPaginationMixin, FeedPagination
 from api.permissions import RecipePermission
+from api.response_cache import get_cached_response
 from api.serializers import (
-    FavoriteSerializer, IngredientViewSerializer,
-    RecipeCreationSerializer, RecipeSerializer,
-    RecipeShopcartSerializer, TagSerializer
+    IngredientViewSerializer, RecipeCreationSerializer,
+    RecipeSerializer, TagSerializer
 )
-from django.db.models import Sum
-from django.http import FileResponse, Http404
+from api.shopping_list import get_cart_version, get_document, get_etag
+from api.utils import bulk_create_recipes, change_counter
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
-from recipe.models import (
-    Favorite, Ingredients, Recipe, RecipeIngredients,
-    Tags, ShopCart
+from recipe.catalog import (
+    get_ingredients, get_tags, ingredients_cache, resolve_ingredients,
+    resolve_tags, tags_cache
 )
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-from rest_framework import filters, status, viewsets
+from recipe.feed import get_feed
+from recipe.models import Favorite, Ingredients, Recipe, Tags, ShopCart
+from recipe.storage import image_storage
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from users.models import Follow, User
+
+
+def to_list(value):
+    return value if isinstance(value, list) else []
+
+
+def to_ids(values):
+    """Integer ids among values, anything else is left to validation."""
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+class CatalogViewMixin:
+    """
+    Serves reference data from the catalog cache.
+
+    Responses carry the catalog version as ETag and may be cached by
+    clients and proxies for max_age seconds.
+    """
+
+    catalog_cache = None
+    max_age = 60 * 60
+
+    def get_catalog(self):
+        raise NotImplementedError
+
+    def catalog_response(self, request, get_data):
+        etag = f'"{self.catalog_cache.get_version()}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(get_data())
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=self.max_age)
+        return response
+
+    def serialize_catalog(self):
+        return list(self.get_serializer(
+            self.get_catalog().values(),
+            many=True
+        ).data)
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(
+            request,
+            lambda: self.catalog_cache.get('list', self.serialize_catalog)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            instance = self.get_catalog()[int(kwargs[self.lookup_field])]
+        except (KeyError, ValueError):
+            raise Http404
+        return self.catalog_response(
+            request,
+            lambda: self.get_serializer(instance).data
+        )
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(
+    FastSerializerMixin,
+    CatalogViewMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """Viewset for Tags."""
 
     serializer_class = TagSerializer
+    fast_serializer_class = FastTagSerializer
     queryset = Tags.objects.all()
     pagination_class = None
+    catalog_cache = tags_cache
+
+    def get_catalog(self):
+        return get_tags()
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(
+    FastSerializerMixin,
+    CatalogViewMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """Viewset for Ingredients."""
 
     serializer_class = IngredientViewSerializer
-    queryset = Ingredients.objects.all()
-    filter_backends = [filters.SearchFilter]
+    fast_serializer_class = FastIngredientSerializer
+    queryset = Ingredients.objects.order_by('name')
     pagination_class = None
-    search_fields = ('^name',)
+    catalog_cache = ingredients_cache
+
+    def get_catalog(self):
+        return get_ingredients()
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return self.catalog_response(
+            request,
+            lambda: self.get_serializer(
+                search_ingredients(name),
+                many=True
+            ).data
+        )
+
+
+class AnonymousCacheMixin:
+    """
+    Serves list and detail pages to anonymous users from cache.
+
+    Responses carry ETag and Last-Modified, so clients and proxies
+    revalidate them without downloading the body again.
+    """
+
+    def cached_response(self, request, build):
+        entry = get_cached_response(request, build)
+        response = get_conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=entry['last_modified']
+        )
+        if response is None:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_cache_control(response, public=True, no_cache=True)
+        #  По тому же адресу авторизованный пользователь видит свои
+        #  избранное и корзину.
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def build_list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        #  Удаление рецепта не оставляет следа в updated_at остальных,
+        #  поэтому страница считается измененной в момент сборки.
+        return response.data, int(timezone.now().timestamp())
 
+    def build_detail(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return (
+            self.get_serializer(instance).data,
+            int(instance.updated_at.timestamp())
+        )
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(
+            request,
+            lambda: self.build_list(request, *args, **kwargs)
+        )
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(
+            request,
+            lambda: self.build_detail(request, *args, **kwargs)
+        )
+
+
+class RecipeViewSet(
+    FastSerializerMixin,
+    AnonymousCacheMixin,
+    CursorPaginationMixin,
+    viewsets.ModelViewSet
+):
     """Viewset for Recipes."""
 
     serializer_class = RecipeSerializer
-    filter_backends = [DjangoFilterBackend, ]
-    filterset_fields = ['author', 'tags__slug']
+    fast_serializer_class = FastRecipeSerializer
+    cursor_ordering = ('name', 'id')
+    bulk_max_items = 200
+    filter_backends = [DjangoFilterBackend, RecipeOrderingFilter]
+    filterset_class = RecipeFilter
+    ordering_fields = ('name', 'favorites_count', 'in_carts_count')
     permission_classes = [RecipePermission, ]
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Recipe.objects.all().annotate(
-        ).prefetch_related(
-            'ingredients',
-            'tags',
-            'author'
-        ).order_by('name')
-        if self.request.query_params.get('is_favorited'):
-            queryset = queryset.filter(favorited__user_id=user.id)
-        if self.request.query_params.get('is_in_shopping_cart'):
-            queryset = queryset.filter(shopcart__user_id=user.id)
-        tags = self.request.query_params.getlist('tags')
-        if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
+        #  Теги и ингредиенты догружает RecipeSerializer, только для
+        #  рецептов, которых нет в кэше фрагментов.
+        queryset = Recipe.objects.order_by('name')
+        if user.is_authenticated:
+            #  Подписка на автора считается одним запросом на всю
+            #  страницу вместе с загрузкой авторов.
+            authors = User.objects.annotate(
+                is_subscribed=Exists(Follow.objects.filter(
+                    user_id=user.id,
+                    author_id=OuterRef('pk')
+                ))
+            )
+            queryset = queryset.prefetch_related(
+                Prefetch('author', queryset=authors)
+            ).annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user_id=user.id,
+                    recipe_id=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShopCart.objects.filter(
+                    user_id=user.id,
+                    recipe_id=OuterRef('pk')
+                ))
+            )
+        else:
+            #  У анонима нет избранного и корзины, запросы не нужны.
+            queryset = queryset.select_related('author').annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False)
+            )
         return queryset
 
     def get_serializer_class(self):
-        if self.action in ['create', 'update', 'partial_update']:
+        if self.action in ['create', 'update', 'partial_update', 'bulk']:
             return RecipeCreationSerializer
-        return self.serializer_class
+        return super().get_serializer_class()
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        change_counter(User, self.request.user.id, 'recipes_count', 1)
 
-    @action(detail=True, methods=('post', 'delete'))
-    def shopping_cart(self, request, **kwargs):
-        """Adds or removes recipe from user's shopping list."""
-        user = self.request.user.id
-        recipe = get_object_or_404(Recipe, **kwargs)
-        if self.request.method == 'POST':
-            serializer = RecipeShopcartSerializer(
-                recipe,
-                data=request.data,
-                context={'request': request},
-                partial=True
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """
+        Recipes of followed authors, newest first.
+
+        Always paginated by cursor, recipe list filters apply as well.
+        """
+        queryset = self.filter_queryset(
+            get_feed(self.get_queryset(), request.user)
+        )
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_bulk_context(self, items):
+        """
+        Serializer context with tags and ingredients of all items,
+        looked up together instead of once per recipe.
+        """
+        tag_ids = []
+        ingredient_ids = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            tag_ids += to_list(item.get('tags'))
+            ingredient_ids += [
+                ingredient.get('id')
+                for ingredient in to_list(item.get('ingredients'))
+                if isinstance(ingredient, dict)
+            ]
+        context = self.get_serializer_context()
+        context['tags'] = resolve_tags(to_ids(tag_ids))
+        context['ingredients'] = resolve_ingredients(to_ids(ingredient_ids))
+        return context
+
+    @action(detail=False, methods=('post',))
+    def bulk(self, request):
+        """
+        Creates a list of recipes at once.
+
+        Every item is validated on its own, valid ones are saved with
+        batched inserts. Response lists result of every item by its
+        index, 207 means some of them failed.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"errors": "Expected a non-empty list of recipes."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {"errors": f"No more than {self.bulk_max_items} recipes "
+                           f"per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        context = self.get_bulk_context(items)
+        results = []
+        valid = []
+        for index, item in enumerate(items):
+            serializer = RecipeCreationSerializer(data=item, context=context)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results.append({
+                    'index': index,
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': serializer.errors
+                })
+        if valid:
+            recipes = bulk_create_recipes(
+                request.user,
+                [data for _, data in valid]
             )
-            serializer.is_valid(raise_exception=True)
-            ShopCart.objects.create(user_id=user, recipe=recipe)
-            return Response(serializer.data)
-        if self.request.method == 'DELETE':
-            try:
-                shop_cart = get_object_or_404(
-                    ShopCart,
+            results += [
+                {
+                    'index': index,
+                    'status': status.HTTP_201_CREATED,
+                    'id': recipe.id
+                }
+                for (index, _), recipe in zip(valid, recipes)
+            ]
+        results.sort(key=lambda result: result['index'])
+        if not valid:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(valid) < len(items):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({'results': results}, status=response_status)
+
+    def toggle_recipe(self, request, pk, model, counter, errors):
+        """
+        Adds recipe to user's list on POST, removes it on DELETE.
+
+        Each direction is one INSERT or one DELETE plus the counter
+        update; the unique constraint, not a prior SELECT, decides if
+        the recipe is already there, so double clicks get 400, not 500.
+        Shopcart rows have a post_delete receiver, so Django selects
+        them before the DELETE.
+        """
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        user = request.user
+        if request.method == 'DELETE':
+            with transaction.atomic():
+                deleted, _ = model.objects.filter(
                     user=user,
-                    recipe=recipe
-                )
-                shop_cart.delete()
+                    recipe_id=pk
+                ).delete()
+                if deleted:
+                    change_counter(Recipe, pk, counter, -1)
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
-            except Http404:
-                return Response(
-                    {"errors": "You dont have this recipe in your shopcart."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            get_object_or_404(Recipe, pk=pk)
+            return Response(
+                {"errors": errors['missing']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        recipe = Recipe.objects.filter(pk=pk).values(
+            'id', 'name', 'image', 'cooking_time'
+        ).first()
+        if recipe is None:
+            raise Http404
+        try:
+            with transaction.atomic():
+                model.objects.create(user=user, recipe_id=pk)
+                change_counter(Recipe, pk, counter, 1)
+        except IntegrityError:
+            #  Вставку ломает и рецепт, удаленный после проверки выше.
+            if not model.objects.filter(user=user, recipe_id=pk).exists():
+                get_object_or_404(Recipe, pk=pk)
+                raise
+            return Response(
+                {"errors": errors['exists']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        recipe['image'] = image_storage.url(recipe['image'])
+        return Response(recipe)
 
-    @action(detail=False)
+    @action(detail=True, methods=('post', 'delete'))
+    def shopping_cart(self, request, pk):
+        """Adds or removes recipe from user's shopping list."""
+        return self.toggle_recipe(
+            request,
+            pk,
+            ShopCart,
+            'in_carts_count',
+            {
+                'exists': 'Item already in shopcart.',
+                'missing': 'You dont have this recipe in your shopcart.',
+            }
+        )
+
+    @action(
+        detail=False,
+        content_negotiation_class=ExportContentNegotiation
+    )
     def download_shopping_cart(self, request):
         """Download user's shopcart."""
 
-        information = ShopCart.objects.filter(
-            recipe__shopcart__user=self.request.user.id
-        )
-        ingredients = information.values(
-            'recipe__recipe_with_ingredient__ingredient'
-        )
-        shopping_list = []
-        #  Temporal list for avoiding duplicates
-        temp_list = []
-        for ingredient in ingredients:
-            try:
-                ingredient_id = ingredient[
-                    'recipe__recipe_with_ingredient__ingredient'
-                ]
-                ingredient_obj = get_object_or_404(
-                    Ingredients,
-                    id=ingredient_id
-                )
-                #  Aggregating total amount of ingredients for all
-                #  recipes related to shopcart
-                if ingredient_obj.name not in temp_list:
-                    amount = RecipeIngredients.objects.filter(
-                        ingredient_id=ingredient_id,
-                        recipe__shopcart__user=self.request.user.id
-                    ).aggregate(Sum('amount'))['amount__sum']
-                    shopping_list.append(
-                        (
-                            ingredient_obj.name,
-                            amount,
-                            ingredient_obj.measurement_unit
-                        )
-                    )
-                #  Adding existing ingredient name to avoid duplicates
-                temp_list.append(ingredient_obj.name)
-            except Http404:
-                continue
-        buffer = BytesIO()
-        file = canvas.Canvas(buffer, pagesize=A4)
-        pdf = file.beginText()
-        pdfmetrics.registerFont(TTFont('TNR', 'Times.ttf'))
-        pdf.setFont("TNR", 18)
-        pdf.setTextOrigin(80, 750)
-        pdf.textLine('Список ингредиентов')
-        pdf.setFont("TNR", 12)
-        for line in shopping_list:
-            pdf.textLine(f'{line[0]} {line[1]} {line[2]}')
-        file.drawText(pdf)
-        file.showPage()
-        file.save()
-        buffer.seek(0)
-        return FileResponse(
-            buffer, as_attachment=True, filename='shopping_cart.pdf'
-        )
+        export_format = request.query_params.get('format', DEFAULT_FORMAT)
+        if export_format not in EXPORTERS:
+            formats = ', '.join(EXPORTERS)
+            return Response(
+                {"errors": f"Unknown format, choose from: {formats}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        exporter = EXPORTERS[export_format]()
+        user = self.request.user.id
+        version = get_cart_version(user)
+        etag = get_etag(version, exporter)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = StreamingHttpResponse(
+                get_document(user, version, exporter),
+                content_type=exporter.content_type
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="{exporter.filename}"'
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     @action(detail=True, methods=('post', 'delete'))
-    def favorite(self, request, **kwargs):
+    def favorite(self, request, pk):
         """Adds or removes recipe from user's favorite list."""
-        user = self.request.user.id
-        recipe = get_object_or_404(Recipe, **kwargs)
-        if self.request.method == 'POST':
-            serializer = FavoriteSerializer(
-                recipe,
-                data=request.data,
-                context={'request': request},
-                partial=True
-            )
-            serializer.is_valid(raise_exception=True)
-            Favorite.objects.create(user_id=user, recipe=recipe)
-            return Response(serializer.data)
-        if self.request.method == 'DELETE':
-            try:
-                shop_cart = get_object_or_404(
-                    Favorite,
-                    user=user,
-                    recipe=recipe
-                )
-                shop_cart.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-            except Http404:
-                return Response(
-                    {"errors": "This recipe is not in your favorites."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        return self.toggle_recipe(
+            request,
+            pk,
+            Favorite,
+            'favorites_count',
+            {
+                'exists': 'This recipe is already favorite.',
+                'missing': 'This recipe is not in your favorites.',
+            }
+        )
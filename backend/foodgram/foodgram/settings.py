@@ -60,6 +60,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -145,6 +146,39 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Recipe images
+
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', default=5 * 1024 * 1024))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+# Render image variants in the request instead of a worker thread (tests)
+IMAGE_PROCESSING_SYNC = os.getenv('IMAGE_PROCESSING_SYNC', default='False') == 'True'
+
+# Feed of followed authors' recipes
+
+# Deliver new recipes to followers' inboxes on write instead of joining
+# follows on every read, pays off for users following many authors
+FEED_FANOUT = os.getenv('FEED_FANOUT', default='False') == 'True'
+# Latest recipes of an author put into the inbox on subscribe
+FEED_BACKFILL_DEPTH = int(os.getenv('FEED_BACKFILL_DEPTH', default=100))
+
+# Anonymous recipe list and detail responses
+
+# Seconds a cached response lives; edits drop the cache at once, only
+# favorites and shopping cart counters may lag behind for this long
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', default=60))
+
+# Build read-only API payloads by hand instead of DRF serializers, see
+# check_serializers command; viewsets may override it
+FAST_SERIALIZERS = os.getenv('FAST_SERIALIZERS', default='True') == 'True'
+
+# Response compression
+
+# Shorter bodies are sent as is, compressing them does not pay off
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', default=1024))
+# Brotli is used when the brotli package is installed, gzip otherwise
+COMPRESSION_BROTLI = os.getenv('COMPRESSION_BROTLI', default='True') == 'True'
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', default=5))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -159,6 +193,15 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageSizePagination',
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'PAGE_SIZE': 20,
@@ -6,8 +6,10 @@ from recipe.models import (
     RecipeIngredients,
     RecipeTags,
     Favorite,
-    ShopCart
+    ShopCart,
+    recipes_changed
 )
+from recipe.search import update_search_index
 
 
 class RIInline(admin.TabularInline):
@@ -30,9 +32,19 @@ class RecipeAdmin(admin.ModelAdmin):
     """Admin for RIInline."""
 
     inlines = [RIInline, RTInline]
-    list_display = ['name', 'author', ]
+    list_display = ['name', 'author', 'favorites_count', ]
     list_filter = ['author', 'name', 'tags', ]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        #  Ингредиенты сохраняются инлайнами, после самого рецепта.
+        update_search_index([form.instance.id])
+        recipes_changed.send(
+            sender=Recipe,
+            recipe_ids=[form.instance.id],
+            ingredients=True
+        )
+
 
 class IngredientsAdmin(admin.ModelAdmin):
     """Admin for RIInline."""
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.core.cache import cache
+from recipe.models import Ingredients, Tags
+
+
+SHARED_TIMEOUT = 60 * 60 * 24
+
+
+class CatalogCache:
+    """
+    Versioned read-through cache for near-static reference data.
+
+    Values are kept in a process-local LRU in front of Django's cache.
+    The version token lives in Django's cache, so an invalidation done
+    by one process is picked up by the others within `ttl` seconds.
+    With shared=False values stay in the process only, for catalogs
+    too large for a single item of the shared cache.
+    """
+
+    def __init__(self, name, ttl=60, maxsize=16, shared=True):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.shared = shared
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.version = None
+        self.version_expires = 0
+
+    @property
+    def version_key(self):
+        return f'catalog-version:{self.name}'
+
+    def get_version(self):
+        """Current version token, re-read from shared cache after ttl."""
+        now = time.monotonic()
+        if self.version is None or now > self.version_expires:
+            version = cache.get(self.version_key)
+            if version is None:
+                cache.add(self.version_key, uuid4().hex, None)
+                version = cache.get(self.version_key)
+            self.version = version
+            self.version_expires = now + self.ttl
+        return self.version
+
+    def get(self, key, loader):
+        """Returns cached value, calling loader on a miss."""
+        version = self.get_version()
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is not None and entry[0] == version:
+                self.local.move_to_end(key)
+                return entry[1]
+        if self.shared:
+            shared_key = f'catalog:{self.name}:{version}:{key}'
+            value = cache.get(shared_key)
+            if value is None:
+                value = loader()
+                cache.set(shared_key, value, SHARED_TIMEOUT)
+        else:
+            value = loader()
+        with self.lock:
+            self.local[key] = (version, value)
+            self.local.move_to_end(key)
+            while len(self.local) > self.maxsize:
+                self.local.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        cache.delete(self.version_key)
+        with self.lock:
+            self.local.clear()
+            self.version = None
+
+
+tags_cache = CatalogCache('tags')
+#  Справочник ингредиентов на 100 тысяч строк весит десяток мегабайт,
+#  больше предела одного значения в Memcached.
+ingredients_cache = CatalogCache('ingredients', shared=False)
+
+
+def get_tags():
+    """Tags by id, in default tag ordering."""
+    return tags_cache.get(
+        'objects',
+        lambda: {tag.id: tag for tag in Tags.objects.all()}
+    )
+
+
+def get_ingredients():
+    """Ingredients by id, ordered by name."""
+    return ingredients_cache.get(
+        'objects',
+        lambda: {
+            ingredient.id: ingredient
+            for ingredient in Ingredients.objects.order_by('name')
+        }
+    )
+
+
+def resolve(catalog, model, ids):
+    """
+    Objects for given ids taken from the catalog.
+
+    Ids the catalog does not know yet, e.g. created by another process
+    a moment ago, are read from the database.
+    """
+    found = {id: catalog[id] for id in ids if id in catalog}
+    missing = set(ids) - found.keys()
+    if missing:
+        found.update(model.objects.in_bulk(missing))
+    return found
+
+
+def resolve_tags(ids):
+    return resolve(get_tags(), Tags, ids)
+
+
+def resolve_ingredients(ids):
+    return resolve(get_ingredients(), Ingredients, ids)
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from recipe.models import FeedItem, Recipe
+from users.models import Follow
+
+
+BATCH_SIZE = 1000
+
+
+def get_feed(queryset, user):
+    """
+    Recipes of authors followed by user, newest first.
+
+    Without fan-out this is a join with the user's follows, with it
+    recipes are read from the user's inbox.
+    """
+    if settings.FEED_FANOUT:
+        queryset = queryset.filter(feed_items__user=user)
+    else:
+        queryset = queryset.filter(author__following__user=user)
+    return queryset.order_by('-id')
+
+
+def fan_out(recipes):
+    """Puts new recipes into inboxes of their authors' followers."""
+    if not settings.FEED_FANOUT:
+        return
+    recipes_by_author = {}
+    for recipe in recipes:
+        recipes_by_author.setdefault(recipe.author_id, []).append(recipe.id)
+    followers = Follow.objects.filter(
+        author_id__in=recipes_by_author
+    ).values_list('author_id', 'user_id')
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, recipe_id=recipe_id)
+            for author_id, user_id in followers.iterator()
+            for recipe_id in recipes_by_author[author_id]
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(follows, depth=None):
+    """
+    Puts latest recipes of followed authors into inboxes.
+
+    follows are (user_id, author_id) pairs, depth limits recipes taken
+    from every author.
+    """
+    if depth is None:
+        depth = settings.FEED_BACKFILL_DEPTH
+    followers_by_author = {}
+    for user_id, author_id in follows:
+        followers_by_author.setdefault(author_id, []).append(user_id)
+    if not followers_by_author:
+        return
+    recipes = Recipe.objects.filter(
+        author_id__in=followers_by_author
+    ).annotate(row_number=Window(
+        RowNumber(),
+        partition_by=F('author_id'),
+        order_by=F('id').desc()
+    )).filter(row_number__lte=depth).values_list('id', 'author_id')
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id, author_id in recipes.iterator()
+            for user_id in followers_by_author[author_id]
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def follow(user_id, author_id):
+    if settings.FEED_FANOUT:
+        backfill([(user_id, author_id)])
+
+
+def unfollow(user_id, author_id):
+    if settings.FEED_FANOUT:
+        FeedItem.objects.filter(
+            user_id=user_id,
+            recipe__author_id=author_id
+        ).delete()
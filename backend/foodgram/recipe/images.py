@@ -0,0 +1,131 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from recipe.models import Recipe, recipes_changed
+from recipe.storage import image_storage
+
+
+logger = logging.getLogger(__name__)
+
+#  Ширина вариантов в пикселях, картинки меньше не растягиваются.
+VARIANTS = {
+    'thumbnail': 320,
+    'medium': 800,
+}
+VARIANTS_DIR = 'images/variants'
+WEBP_QUALITY = 80
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='image-variants'
+        )
+    return _executor
+
+
+def get_variant_name(image_name, variant):
+    """
+    Variant file name derived from the source name.
+
+    Sources are named by content hash, so the same picture always gets
+    the same variants and they are rendered only once.
+    """
+    stem = posixpath.splitext(posixpath.basename(image_name))[0]
+    return posixpath.join(
+        VARIANTS_DIR, stem[:2], stem[2:4], f'{stem}_{variant}.webp'
+    )
+
+
+def render_variants(image_name):
+    """Saves missing WebP variants of stored image, returns names."""
+    variants = {
+        variant: get_variant_name(image_name, variant)
+        for variant in VARIANTS
+    }
+    missing = [
+        variant for variant, name in variants.items()
+        if not image_storage.reuse(name)
+    ]
+    if not missing:
+        return variants
+    with image_storage.open(image_name) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    for variant in missing:
+        width = VARIANTS[variant]
+        resized = image.copy()
+        resized.thumbnail((width, width * 4))
+        buffer = BytesIO()
+        resized.save(buffer, 'WEBP', quality=WEBP_QUALITY)
+        variants[variant] = image_storage.save_as(
+            variants[variant], ContentFile(buffer.getvalue())
+        )
+    return variants
+
+
+def attach_variants(recipe_id, image_name):
+    """Renders variants and attaches them to recipe."""
+    variants = render_variants(image_name)
+    #  Пока шла обработка, картинку могли заменить.
+    updated = Recipe.objects.filter(
+        pk=recipe_id,
+        image=image_name
+    ).update(image_variants=variants, updated_at=timezone.now())
+    #  Варианты замененной картинки удалит cleanup_images.
+    if updated:
+        recipes_changed.send(sender=Recipe, recipe_ids=[recipe_id])
+
+
+def process_image(recipe_id, image_name):
+    """Worker task, errors are logged since nobody waits for it."""
+    close_old_connections()
+    try:
+        attach_variants(recipe_id, image_name)
+    except Exception:
+        logger.exception('Image variants of %s failed', image_name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(recipe):
+    """
+    Queues variants rendering once current transaction commits.
+
+    With IMAGE_PROCESSING_SYNC variants are rendered right away, which
+    keeps tests and management commands deterministic.
+    """
+    image_name = recipe.image.name
+    if not image_name:
+        return
+    if settings.IMAGE_PROCESSING_SYNC:
+        transaction.on_commit(
+            lambda: attach_variants(recipe.id, image_name)
+        )
+    else:
+        transaction.on_commit(lambda: get_executor().submit(
+            process_image, recipe.id, image_name
+        ))
+
+
+def variant_urls(recipe, request=None):
+    """Absolute URLs of ready variants, empty while processing."""
+    urls = {}
+    for variant, name in (recipe.image_variants or {}).items():
+        url = image_storage.url(name)
+        urls[variant] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from recipe.feed import backfill
+from recipe.models import FeedItem
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    """Manage command filling feed inboxes from existing follows."""
+
+    help = (
+        'Fills feed inboxes with latest recipes of followed authors, '
+        'e.g. after enabling FEED_FANOUT.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='Only fill inbox of the user with this id.'
+        )
+        parser.add_argument(
+            '--depth',
+            type=int,
+            default=settings.FEED_BACKFILL_DEPTH,
+            help='Latest recipes taken from every author.'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Empty inboxes before filling them.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.order_by('id')
+        items = FeedItem.objects.all()
+        if options['user'] is not None:
+            follows = follows.filter(user_id=options['user'])
+            items = items.filter(user_id=options['user'])
+        if options['clear']:
+            items.delete()
+        follows = list(follows.values_list('user_id', 'author_id'))
+        batch_size = options['batch_size']
+        for start in range(0, len(follows), batch_size):
+            with transaction.atomic():
+                backfill(
+                    follows[start:start + batch_size],
+                    depth=options['depth']
+                )
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Feed filled for {len(follows)} follows.'
+            ))
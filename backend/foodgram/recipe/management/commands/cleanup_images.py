@@ -0,0 +1,69 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+from recipe.models import Recipe
+from recipe.storage import image_storage
+
+
+IMAGES_DIR = 'images'
+
+
+class Command(BaseCommand):
+    """Manage command removing image files no recipe refers to."""
+
+    help = (
+        'Deletes recipe images and variants left without recipes, '
+        'e.g. replaced or deleted ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list files that would be deleted.'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60,
+            help='Minutes since the file was last written or reused, '
+                 'younger files may belong to unfinished uploads.'
+        )
+
+    def handle(self, *args, **options):
+        #  Граница по времени берется до чтения ссылок: файл, занятый
+        #  позже, окажется моложе нее.
+        threshold = timezone.now() - timedelta(minutes=options['min_age'])
+        referenced = set()
+        for image_name, variants in Recipe.objects.exclude(
+            image=''
+        ).values_list('image', 'image_variants').iterator():
+            referenced.add(image_name)
+            #  Имена из базы: save_as мог сохранить вариант с суффиксом.
+            referenced.update((variants or {}).values())
+        deleted = 0
+        for name in self.walk(IMAGES_DIR):
+            if name in referenced or (
+                image_storage.get_modified_time(name) > threshold
+            ):
+                continue
+            if options['verbosity'] > 1 or options['dry_run']:
+                self.stdout.write(name)
+            if not options['dry_run']:
+                image_storage.delete(name)
+            deleted += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'{deleted} unreferenced files '
+            f'{"found" if options["dry_run"] else "deleted"}.'
+        ))
+
+    def walk(self, directory):
+        if not image_storage.exists(directory):
+            return
+        directories, files = image_storage.listdir(directory)
+        for file in files:
+            yield posixpath.join(directory, file)
+        for child in directories:
+            yield from self.walk(posixpath.join(directory, child))
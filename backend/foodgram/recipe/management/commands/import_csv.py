@@ -1,31 +1,173 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from recipe.catalog import ingredients_cache
+from recipe.models import Ingredients, normalize_name
 
-from .serializers_for_import import IngredientSerializer
+
+FIELDS = ('name', 'measurement_unit')
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    """Yields rows of CSV file, header line is optional."""
+    reader = csv.reader(file)
+    first = next(reader, None)
+    if first is None:
+        return
+    if 'name' in first:
+        header = first
+    else:
+        header = FIELDS
+        yield dict(zip(header, first))
+    for row in reader:
+        yield dict(zip(header, row))
+
+
+def read_json(file):
+    """Yields objects of JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('JSON file must contain an array.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield row
+        if not chunk:
+            return
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def clean_row(row):
+    """Returns ingredient built from row or raises ValueError."""
+    values = {}
+    for field in FIELDS + ('slug',):
+        value = str(row.get(field) or '').strip()
+        max_length = Ingredients._meta.get_field(field).max_length
+        if len(value) > max_length:
+            raise ValueError(f'{field} is longer than {max_length}')
+        values[field] = value
+    if not values['name'] or not values['measurement_unit']:
+        raise ValueError('name and measurement_unit are required')
+    return Ingredients(
+        search_name=normalize_name(values['name']),
+        **values
+    )
 
 
 class Command(BaseCommand):
     """Managa command for importing ingredients."""
 
-    help = 'Adds ingredients to your database.'
+    help = (
+        'Adds ingredients from CSV or JSON file to your database, '
+        'existing ingredients are updated instead of duplicated.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='data/ingredients.csv',
+            help='CSV or JSON file with name and measurement_unit.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
 
     def handle(self, *args, **options):
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(
+                f'Unsupported file type {path.suffix}, '
+                f'use one of: {", ".join(READERS)}.'
+            )
+        started = time.perf_counter()
+        imported = 0
+        rows = self.clean_rows(reader, path)
+        while True:
+            batch = list(islice(rows, options['batch_size']))
+            if not batch:
+                break
+            self.save_batch(batch)
+            imported += len(batch)
+            #  bulk_create не отправляет сигналы, кэш справочника
+            #  сбрасываем сами.
+            ingredients_cache.invalidate()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{imported} rows, {imported / elapsed:.0f} rows/s'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Файл {path.name} успешно загружен в базу: {imported} '
+            f'строк за {time.perf_counter() - started:.2f} с'
+        ))
+
+    def clean_rows(self, reader, path):
+        """Yields valid ingredients, invalid rows are reported."""
         try:
-            with open('data/ingredients.csv', encoding="utf8") as csv_file:
-                reader = csv.DictReader(csv_file)
-                for row_dict in reader:
-                    serializer = IngredientSerializer(data=row_dict)
-                    if serializer.is_valid():
-                        serializer.save()
-                    else:
+            with open(path, encoding='utf8') as file:
+                for number, row in enumerate(reader(file), start=1):
+                    try:
+                        yield clean_row(row)
+                    except (ValueError, AttributeError) as error:
                         self.stdout.write(self.style.ERROR(
-                            'Ошибка в файле ingredients.csv\n'
-                            f'{serializer.errors} {row_dict}'
+                            f'Ошибка в файле {path.name}, запись {number}: '
+                            f'{error} {row}'
                         ))
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError) as error:
+            raise CommandError(f'Ошибка {error}')
+
+    def save_batch(self, batch):
+        """
+        Inserts new ingredients and updates existing ones.
 
-                self.stdout.write(self.style.SUCCESS(
-                    'Файл ingredients.csv успешно загружен в базу'
-                ))
-        except Exception as e:
-            raise Exception(f'Ошибка {e}')
+        Only slug can be updated, so rows without it are left as they
+        are in the database.
+        """
+        #  Один и тот же ингредиент дважды в одном INSERT ... ON CONFLICT
+        #  PostgreSQL не пропустит.
+        batch = {
+            (ingredient.name, ingredient.measurement_unit): ingredient
+            for ingredient in batch
+        }.values()
+        with transaction.atomic():
+            Ingredients.objects.bulk_create(
+                [ingredient for ingredient in batch if ingredient.slug],
+                update_conflicts=True,
+                unique_fields=FIELDS,
+                update_fields=['slug']
+            )
+            Ingredients.objects.bulk_create(
+                [ingredient for ingredient in batch if not ingredient.slug],
+                ignore_conflicts=True
+            )
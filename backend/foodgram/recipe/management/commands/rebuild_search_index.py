@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from recipe.models import Recipe
+from recipe.search import update_search_index
+
+
+class Command(BaseCommand):
+    """Manage command rebuilding recipe search documents."""
+
+    help = (
+        'Rebuilds search documents of all recipes, e.g. after bulk '
+        'loading or renaming ingredients.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)
+        )
+        batch_size = options['batch_size']
+        for start in range(0, len(recipe_ids), batch_size):
+            with transaction.atomic():
+                update_search_index(recipe_ids[start:start + batch_size])
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Search index rebuilt for {len(recipe_ids)} recipes.'
+            ))
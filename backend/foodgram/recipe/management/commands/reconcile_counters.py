@@ -0,0 +1,87 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipe.models import Favorite, Recipe, RecipeIngredients, ShopCart
+from users.models import Follow, User
+
+
+#  Счетчик, модель связи и поле связи, по которым он считается.
+COUNTERS = {
+    Recipe: (
+        ('favorites_count', Favorite, 'recipe'),
+        ('in_carts_count', ShopCart, 'recipe'),
+        ('ingredients_count', RecipeIngredients, 'recipe'),
+    ),
+    User: (
+        ('recipes_count', Recipe, 'author'),
+        ('followers_count', Follow, 'author'),
+    ),
+}
+
+
+def count_related(model, field):
+    """Subquery counting rows of model pointing to the outer row."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    """Manage command repairing denormalized counters."""
+
+    help = (
+        'Recounts favorites, shopping carts, ingredients, recipes and '
+        'followers counters and fixes rows that drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Rows checked per UPDATE, by primary key range.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted rows.'
+        )
+
+    def handle(self, *args, **options):
+        for model, counters in COUNTERS.items():
+            for field, related_model, related_field in counters:
+                fixed = self.reconcile(
+                    model,
+                    field,
+                    count_related(related_model, related_field),
+                    options
+                )
+                if options['verbosity']:
+                    self.stdout.write(
+                        f'{model.__name__}.{field}: {fixed} rows drifted'
+                    )
+
+    def reconcile(self, model, field, actual, options):
+        """Fixes counter in primary key ranges, returns drifted rows."""
+        last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        batch_size = options['batch_size']
+        fixed = 0
+        for start in range(0, last + 1, batch_size):
+            rows = model.objects.filter(
+                pk__gte=start,
+                pk__lt=start + batch_size
+            )
+            with transaction.atomic():
+                drifted = rows.annotate(actual=actual).exclude(
+                    **{field: F('actual')}
+                ).values('pk')
+                if options['dry_run']:
+                    fixed += drifted.count()
+                else:
+                    fixed += model.objects.filter(
+                        pk__in=Subquery(drifted)
+                    ).update(**{field: actual})
+        return fixed
@@ -0,0 +1,124 @@
+# Generated by Django 4.2.1 on 2023-06-22 19:04
+
+#  Та же 0001_initial, но measurement_unit с max_length: без длины
+#  SQLite не создает таблицу. Базы, где 0001_initial уже применена,
+#  получают длину миграцией 0014.
+
+import colorfield.fields
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    replaces = [('recipe', '0001_initial')]
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ingredients',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256)),
+                ('measurement_unit', models.CharField(max_length=200, verbose_name='единицы измерения')),
+                ('slug', models.SlugField(max_length=90)),
+            ],
+            options={
+                'verbose_name_plural': 'Ingredients',
+                'ordering': ('-name',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Recipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256)),
+                ('image', models.ImageField(blank=True, max_length=250, null=True, upload_to='images/')),
+                ('text', models.TextField(verbose_name='Текст рецепта')),
+                ('cooking_time', models.PositiveSmallIntegerField(verbose_name='Время приготовления')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name_plural': 'Recipes',
+                'ordering': ['-name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Tags',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30)),
+                ('color', colorfield.fields.ColorField(default='#FF0000', image_field=None, max_length=18, samples=None)),
+                ('slug', models.SlugField(max_length=30, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Tags',
+                'ordering': ('-name',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ShopCart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shopcart', to='recipe.recipe')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeTags',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_with_tag', to='recipe.recipe')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag', to='recipe.tags')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeIngredients',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.FloatField()),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient', to='recipe.ingredients')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_with_ingredient', to='recipe.recipe')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients',
+            field=models.ManyToManyField(related_name='recipes', through='recipe.RecipeIngredients', to='recipe.ingredients', verbose_name='Индгредиенты'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='recipes', through='recipe.RecipeTags', to='recipe.tags', verbose_name='Теги'),
+        ),
+        migrations.CreateModel(
+            name='Favorite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='favorited', to='recipe.recipe')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='shopcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipetags',
+            constraint=models.UniqueConstraint(fields=('recipe', 'tag'), name='unique_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredients',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_ingredient_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe_favorite'),
+        ),
+    ]
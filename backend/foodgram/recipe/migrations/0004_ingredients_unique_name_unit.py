@@ -0,0 +1,50 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:12
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Merges ingredients created by repeated imports into one record."""
+    Ingredients = apps.get_model('recipe', 'Ingredients')
+    RecipeIngredients = apps.get_model('recipe', 'RecipeIngredients')
+    duplicates = Ingredients.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        first_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for duplicate in duplicates:
+        first_id = duplicate['first_id']
+        extra = Ingredients.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).exclude(id=first_id)
+        for link in RecipeIngredients.objects.filter(ingredient__in=extra):
+            existing = RecipeIngredients.objects.filter(
+                recipe_id=link.recipe_id, ingredient_id=first_id
+            ).first()
+            if existing is None:
+                link.ingredient_id = first_id
+                link.save(update_fields=['ingredient'])
+            else:
+                existing.amount += link.amount
+                existing.save(update_fields=['amount'])
+                link.delete()
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0003_alter_recipe_image_alter_recipe_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredients',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    Ingredients = apps.get_model('recipe', 'Ingredients')
+    ingredients = list(Ingredients.objects.only('id', 'name'))
+    for ingredient in ingredients:
+        ingredient.search_name = (
+            ingredient.name.strip().lower().replace('ё', 'е')
+        )
+    Ingredients.objects.bulk_update(
+        ingredients, ['search_name'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0004_ingredients_unique_name_unit'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredients',
+            options={'verbose_name_plural': 'Ingredients'},
+        ),
+        migrations.AddField(
+            model_name='ingredients',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=256, verbose_name='название для поиска'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredients',
+            index=models.Index(fields=['search_name'], name='ingredient_search_name_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0005_ingredients_search_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['name', 'id'], name='recipe_name_id_idx'),
+        ),
+    ]
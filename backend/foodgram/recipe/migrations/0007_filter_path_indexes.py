@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0006_recipe_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'name'], name='recipe_author_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetags',
+            index=models.Index(fields=['tag', 'recipe'], name='tag_recipe_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Recipe.objects.update(
+        favorites_count=count_related(
+            apps.get_model('recipe', 'Favorite'), 'recipe'
+        ),
+        in_carts_count=count_related(
+            apps.get_model('recipe', 'ShopCart'), 'recipe'
+        ),
+        ingredients_count=count_related(
+            apps.get_model('recipe', 'RecipeIngredients'), 'recipe'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0007_filter_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество ингредиентов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', 'id'], name='recipe_favorites_count_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:26
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+POSTGRESQL_FORWARD = (
+    "CREATE INDEX recipe_search_vector_idx ON recipe_recipe "
+    "USING gin (search_vector)",
+    "UPDATE recipe_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', replace(lower(name), 'ё', 'е')), 'A')"
+    " || setweight(to_tsvector('russian', replace(lower(coalesce(("
+    "SELECT string_agg(i.name, ' ') FROM recipe_recipeingredients ri "
+    "JOIN recipe_ingredients i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = recipe_recipe.id), '')), 'ё', 'е')), 'B')"
+    " || setweight(to_tsvector('russian', replace(lower(text), 'ё', 'е')), 'C')",
+)
+POSTGRESQL_BACKWARD = (
+    "DROP INDEX IF EXISTS recipe_search_vector_idx",
+)
+#  unicode61 сам приводит регистр, но ё в е не переводит.
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE recipe_search USING fts5("
+    "name, ingredients, text, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER recipe_search_delete AFTER DELETE ON recipe_recipe "
+    "BEGIN DELETE FROM recipe_search WHERE rowid = old.id; END",
+    "INSERT INTO recipe_search (rowid, name, ingredients, text) "
+    "SELECT r.id, replace(replace(r.name, 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce(("
+    "SELECT group_concat(i.name, ' ') FROM recipe_recipeingredients ri "
+    "JOIN recipe_ingredients i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = r.id), ''), 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(r.text, 'ё', 'е'), 'Ё', 'Е') FROM recipe_recipe r",
+)
+SQLITE_BACKWARD = (
+    "DROP TRIGGER IF EXISTS recipe_search_delete",
+    "DROP TABLE IF EXISTS recipe_search",
+)
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0008_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run_for_vendor({
+                'postgresql': POSTGRESQL_FORWARD,
+                'sqlite': SQLITE_FORWARD,
+            }),
+            run_for_vendor({
+                'postgresql': POSTGRESQL_BACKWARD,
+                'sqlite': SQLITE_BACKWARD,
+            }),
+        ),
+    ]
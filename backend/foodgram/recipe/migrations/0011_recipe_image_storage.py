@@ -0,0 +1,19 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:30
+
+from django.db import migrations, models
+import recipe.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0010_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(max_length=250, storage=recipe.storage.get_image_storage, upload_to='images/'),
+        ),
+    ]
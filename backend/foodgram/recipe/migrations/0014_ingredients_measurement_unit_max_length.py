@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0013_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredients',
+            name='measurement_unit',
+            field=models.CharField(max_length=200, verbose_name='единицы измерения'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:30
+
+from django.db import migrations
+
+
+#  porter приводит английские слова к основе, русские остаются как
+#  есть и ищутся только по началу слова.
+PORTER = 'porter unicode61 remove_diacritics 2'
+UNICODE61 = 'unicode61 remove_diacritics 2'
+FILL = (
+    "INSERT INTO recipe_search (rowid, name, ingredients, text) "
+    "SELECT r.id, replace(replace(r.name, 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce(("
+    "SELECT group_concat(i.name, ' ') FROM recipe_recipeingredients ri "
+    "JOIN recipe_ingredients i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = r.id), ''), 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(r.text, 'ё', 'е'), 'Ё', 'Е') FROM recipe_recipe r"
+)
+
+
+def recreate_search_table(tokenizer):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        schema_editor.execute('DROP TABLE IF EXISTS recipe_search')
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE recipe_search USING fts5('
+            f"name, ingredients, text, tokenize='{tokenizer}')"
+        )
+        schema_editor.execute(FILL)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0014_ingredients_measurement_unit_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recreate_search_table(PORTER),
+            recreate_search_table(UNICODE61),
+        ),
+    ]
@@ -1,25 +1,59 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.validators import MinValueValidator
-from users.models import User
+from django.dispatch import Signal
+from recipe.storage import get_image_storage
+from users.models import CounterFieldsMixin, User
 
 
 MIN_VALUE = 1
 
 
+def normalize_name(name):
+    """Name form used for ingredient search."""
+    return name.strip().lower().replace('ё', 'е')
+
+
 class Ingredients(models.Model):
     """Ingredients model."""
 
     name = models.CharField(max_length=256)
-    measurement_unit = models.CharField(verbose_name='единицы измерения')
+    measurement_unit = models.CharField(
+        max_length=200,
+        verbose_name='единицы измерения'
+    )
     slug = models.SlugField(max_length=90)
+    search_name = models.CharField(
+        max_length=256,
+        editable=False,
+        verbose_name='название для поиска'
+    )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
     class Meta:
-        ordering = ('-name',)
         verbose_name_plural = 'Ingredients'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
+        indexes = [
+            #  varchar_pattern_ops нужен PostgreSQL для LIKE 'абр%'
+            #  при любой локали базы, на других СУБД игнорируется.
+            models.Index(
+                fields=['search_name'],
+                name='ingredient_search_name_idx',
+                opclasses=['varchar_pattern_ops']
+            )
+        ]
 
 
 class Tags(models.Model):
@@ -37,7 +71,7 @@ class Tags(models.Model):
         verbose_name_plural = 'Tags'
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     """Recipe model."""
 
     author = models.ForeignKey(
@@ -49,8 +83,12 @@ class Recipe(models.Model):
     name = models.CharField(max_length=256)
     image = models.ImageField(
         upload_to='images/',
+        storage=get_image_storage,
         max_length=250
     )
+    #  Уменьшенные WebP копии картинки, {вариант: имя файла}. Пока
+    #  фоновая обработка не закончилась, словарь пуст.
+    image_variants = models.JSONField(default=dict, editable=False)
     text = models.TextField(verbose_name='Текст рецепта')
     ingredients = models.ManyToManyField(
         Ingredients,
@@ -68,6 +106,36 @@ class Recipe(models.Model):
         verbose_name='Время приготовления',
         validators=[MinValueValidator(MIN_VALUE)]
     )
+    #  Счетчики обновляются вместе с изменением связей, расхождения
+    #  исправляет команда reconcile_counters.
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок'
+    )
+    ingredients_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество ингредиентов'
+    )
+
+    #  Поисковый документ из названия, ингредиентов и описания,
+    #  пересчитывается recipe.search.update_search_index. GIN индекс
+    #  создает миграция 0009 только на PostgreSQL.
+    search_vector = SearchVectorField(null=True, editable=False)
+    #  Время последнего изменения рецепта для Last-Modified, счетчики
+    #  его не трогают.
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменен'
+    )
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     def __str__(self):
         return f'{self.author.username} {self.name}'
@@ -75,6 +143,20 @@ class Recipe(models.Model):
     class Meta:
         ordering = ('-name',)
         verbose_name_plural = 'Recipes'
+        indexes = [
+            #  Ключ курсорной пагинации ленты рецептов.
+            models.Index(fields=['name', 'id'], name='recipe_name_id_idx'),
+            #  Рецепты автора (?author=) сразу в порядке выдачи.
+            models.Index(
+                fields=['author', 'name'],
+                name='recipe_author_name_idx'
+            ),
+            #  Сортировка по популярности (?ordering=-favorites_count).
+            models.Index(
+                fields=['-favorites_count', 'id'],
+                name='recipe_favorites_count_idx'
+            ),
+        ]
 
 
 class RecipeIngredients(models.Model):
@@ -129,6 +211,11 @@ class RecipeTags(models.Model):
                 name='unique_tag'
             )
         ]
+        indexes = [
+            #  Фильтр по тегам идет от тега к рецептам, уникальный
+            #  индекс (recipe, tag) для этого не подходит.
+            models.Index(fields=['tag', 'recipe'], name='tag_recipe_idx'),
+        ]
 
 
 class Favorite(models.Model):
@@ -177,3 +264,34 @@ class ShopCart(models.Model):
                 name='unique_user_recipe'
             )
         ]
+
+
+class FeedItem(models.Model):
+    """Recipe delivered to follower's feed, fan-out on write."""
+
+    user = models.ForeignKey(
+        User,
+        related_name='feed_items',
+        on_delete=models.CASCADE
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_items',
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        constraints = [
+            #  Этот же индекс отдает ленту пользователя в порядке
+            #  рецептов.
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_item'
+            )
+        ]
+
+
+#  Рецепты изменились в обход Recipe.save(): через update() или
+#  инлайнами админки. Аргументы: recipe_ids и ingredients, менялся ли
+#  состав. Кэши ответов сбрасывают получатели в api.
+recipes_changed = Signal()
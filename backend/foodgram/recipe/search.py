@@ -0,0 +1,133 @@
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Lower, Replace
+from recipe.models import Recipe, RecipeIngredients, normalize_name
+
+
+SEARCH_CONFIG = 'russian'
+#  Таблица FTS5 для SQLite, создается миграциями 0009 и 0015.
+FTS_TABLE = 'recipe_search'
+#  Веса полей для bm25: название, ингредиенты, описание.
+FTS_WEIGHTS = '10.0, 5.0, 1.0'
+MAX_WORDS = 10
+
+
+def get_words(query):
+    return re.findall(r'\w+', normalize_name(query))[:MAX_WORDS]
+
+
+def normalized(expression):
+    return Replace(Lower(expression), Value('ё'), Value('е'))
+
+
+def update_postgresql(recipe_ids):
+    #  Модуль тянет psycopg, поэтому импортируется только здесь.
+    from django.contrib.postgres.aggregates import StringAgg
+
+    ingredient_names = Subquery(
+        RecipeIngredients.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+    )
+    Recipe.objects.filter(pk__in=recipe_ids).update(search_vector=(
+        SearchVector(
+            normalized('name'), weight='A', config=SEARCH_CONFIG
+        )
+        + SearchVector(
+            normalized(Coalesce(ingredient_names, Value(''))),
+            weight='B',
+            config=SEARCH_CONFIG
+        )
+        + SearchVector(
+            normalized('text'), weight='C', config=SEARCH_CONFIG
+        )
+    ))
+
+
+def update_sqlite(recipe_ids):
+    ingredient_names = defaultdict(list)
+    for recipe_id, name in RecipeIngredients.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient__name'):
+        ingredient_names[recipe_id].append(name)
+    rows = [
+        (
+            recipe_id,
+            normalize_name(name),
+            normalize_name(' '.join(ingredient_names[recipe_id])),
+            normalize_name(text)
+        )
+        for recipe_id, name, text in Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).values_list('id', 'name', 'text')
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(recipe_id,) for recipe_id in recipe_ids]
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+            f'VALUES (%s, %s, %s, %s)',
+            rows
+        )
+
+
+def update_search_index(recipe_ids):
+    """
+    Rebuilds stored search documents of given recipes.
+
+    Called after recipe name, text or ingredients are saved.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connection.vendor == 'postgresql':
+        update_postgresql(recipe_ids)
+    elif connection.vendor == 'sqlite':
+        update_sqlite(recipe_ids)
+
+
+def search_recipes(queryset, query):
+    """
+    Recipes matching all words of query, best matches first.
+
+    PostgreSQL matches stored search_vector through the GIN index,
+    SQLite uses the FTS5 table with prefix matching. SQLite stems
+    only English words, Russian ones match by prefix, so `супы` does
+    not find `суп`. Other databases only look at recipe names.
+    """
+    words = get_words(query)
+    if not words:
+        return queryset
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            ' '.join(words), config=SEARCH_CONFIG, search_type='plain'
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', 'id')
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        table = queryset.model._meta.db_table
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match,)
+        )).order_by('-search_rank', 'id')
+    condition = Q()
+    for word in words:
+        condition &= Q(name__icontains=word)
+    return queryset.filter(condition)
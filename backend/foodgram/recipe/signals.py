@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipe import feed
+from recipe.catalog import ingredients_cache, tags_cache
+from recipe.models import Ingredients, Recipe, Tags
+from users.models import Follow, User
+
+
+def change_followers(author_id, delta):
+    User.objects.filter(pk=author_id).update(
+        followers_count=F('followers_count') + delta
+    )
+
+
+@receiver([post_save, post_delete], sender=Tags)
+def tags_changed(sender, **kwargs):
+    #  До коммита другой процесс перечитает старый каталог и
+    #  закэширует его под новой версией.
+    transaction.on_commit(tags_cache.invalidate)
+
+
+@receiver([post_save, post_delete], sender=Ingredients)
+def ingredients_changed(sender, **kwargs):
+    transaction.on_commit(ingredients_cache.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out([instance])
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        change_followers(instance.author_id, 1)
+        feed.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    #  Сюда же приходят подписки, удаленные каскадом вместе с
+    #  подписчиком.
+    change_followers(instance.author_id, -1)
+    feed.unfollow(instance.user_id, instance.author_id)
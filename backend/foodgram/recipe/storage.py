@@ -0,0 +1,61 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage naming files by SHA-256 of their content.
+
+    `images/temp.png` is stored as `images/ab/cd/abcd...ef.png`, so the
+    same picture uploaded again maps to the file already on disk and
+    is not written twice. Such names never change their content and
+    can be cached forever.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.hashed_name(name, content)
+        if self.reuse(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def reuse(self, name):
+        """
+        Tells if the file exists, marking it as just used.
+
+        cleanup_images skips recently modified files, so a file taken
+        by a transaction that has not committed yet is not deleted.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def save_as(self, name, content):
+        """Saves file derived from a hashed one under the given name."""
+        return super().save(name, content)
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    return image_storage
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from recipe.catalog import (
+    get_ingredients, ingredients_cache, resolve_ingredients
+)
+from recipe.models import Ingredients, Recipe
+from recipe.storage import image_storage
+from users.models import User
+
+
+class CleanupImagesTests(TestCase):
+    """Image files are deleted only by the cleanup_images sweep."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user(
+            email='author@foodgram.ru',
+            username='author',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password'
+        )
+
+    def store(self, name, content, age=None):
+        name = image_storage.save_as(name, ContentFile(content))
+        if age is not None:
+            past = time.time() - age
+            os.utime(image_storage.path(name), (past, past))
+        return name
+
+    def create_recipe(self, image, variants=None):
+        return Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            image=image,
+            image_variants=variants or {},
+            text='Описание рецепта.',
+            cooking_time=10
+        )
+
+    def cleanup(self):
+        call_command('cleanup_images', stdout=StringIO())
+
+    def test_referenced_and_fresh_files_are_kept(self):
+        image = self.store('images/ab/cd/abcd.png', b'image', age=7200)
+        #  Суффикс, как у save_as при гонке за одно имя.
+        variant = self.store(
+            'images/variants/ab/cd/abcd_thumbnail_x1y2.webp',
+            b'variant', age=7200
+        )
+        self.create_recipe(image, {'thumbnail': variant})
+        orphan = self.store('images/ef/01/ef01.png', b'orphan', age=7200)
+        fresh = self.store('images/23/45/2345.png', b'fresh')
+        self.cleanup()
+        self.assertTrue(image_storage.exists(image))
+        self.assertTrue(image_storage.exists(variant))
+        self.assertFalse(image_storage.exists(orphan))
+        self.assertTrue(image_storage.exists(fresh))
+
+    def test_reused_file_is_fresh(self):
+        name = image_storage.save('images/recipe.png', ContentFile(b'old'))
+        past = time.time() - 7200
+        os.utime(image_storage.path(name), (past, past))
+        #  Та же картинка в незавершенной транзакции.
+        self.assertEqual(
+            image_storage.save('images/recipe.png', ContentFile(b'old')),
+            name
+        )
+        self.cleanup()
+        self.assertTrue(image_storage.exists(name))
+
+    def test_recipe_delete_keeps_file(self):
+        image = self.store('images/ab/cd/abcd.png', b'image')
+        recipe = self.create_recipe(image)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertTrue(image_storage.exists(image))
+
+
+class CatalogCacheTests(TestCase):
+    """Ingredient catalog kept in process memory."""
+
+    def setUp(self):
+        cache.clear()
+        ingredients_cache.invalidate()
+        self.ingredient = Ingredients.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+
+    def test_ingredients_stay_out_of_shared_cache(self):
+        self.assertIn(self.ingredient.id, get_ingredients())
+        self.assertFalse([
+            key for key in cache._cache if 'catalog:ingredients' in key
+        ])
+        with self.assertNumQueries(0):
+            get_ingredients()
+
+    def test_new_ingredient_is_resolved(self):
+        get_ingredients()
+        added = Ingredients.objects.create(name='Перец', measurement_unit='г')
+        with self.assertNumQueries(1):
+            found = resolve_ingredients([self.ingredient.id, added.id, 0])
+        self.assertEqual(set(found), {self.ingredient.id, added.id})
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.1 on 2026-10-18 20:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    apps.get_model('users', 'User').objects.update(
+        recipes_count=count_related(
+            apps.get_model('recipe', 'Recipe'), 'author'
+        ),
+        followers_count=count_related(
+            apps.get_model('users', 'Follow'), 'author'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0001_initial'),
+        ('users', '0002_following_author_user_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,35 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Keeps counter columns out of UPDATE done by save().
+
+    Counters are changed only with F() expressions, so saving an
+    instance loaded earlier must not write back their stale values.
+    Explicit update_fields are left as given. Deferred fields are not
+    saved, as Django itself does for deferred instances.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """Reworked User model."""
 
     email = models.EmailField(
@@ -22,6 +50,18 @@ class User(AbstractUser):
     password = models.CharField(
         max_length=150
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков'
+    )
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     USERNAME_FIELD = 'email'
 
@@ -56,3 +96,10 @@ class Follow(models.Model):
                 name='unique_following'
             )
         ]
+        indexes = [
+            #  Обратное направление: подписчики автора.
+            models.Index(
+                fields=['author', 'user'],
+                name='following_author_user_idx'
+            ),
+        ]
@@ -4,6 +4,7 @@ from rest_framework.serializers import (
     SerializerMethodField, ModelSerializer, BooleanField
 )
 from users.models import Follow
+from recipe.images import variant_urls
 from recipe.models import Recipe
 from django.core.exceptions import ValidationError
 
@@ -26,8 +27,13 @@ class CustomUserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         """Subscription check."""
+        #  Для списков рецептов подписка уже посчитана в queryset.
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         try:
             user = self.context.get('request').user
+            if user.is_anonymous:
+                return False
             return Follow.objects.filter(user=user.id, author=obj).exists()
         #  Обработка нужна, т.к. после создания рецепта у нас нет информации
         #  о текущем юзере, соответсвенно прилетает ошибка. Т.к. подписаться
@@ -51,17 +57,28 @@ class CreateUserSerializer(UserSerializer):
 
 
 class ShortRecipeSerializer(ModelSerializer):
-    """Short version of recipe serializer."""
+    """
+    Short version of recipe serializer.
+
+    Every field is a column of the recipe row, which is loaded anyway,
+    so the fragment cache of full recipes is not used here.
+    """
+
+    image_variants = SerializerMethodField()
 
     class Meta:
         fields = [
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time',
         ]
         model = Recipe
 
+    def get_image_variants(self, obj):
+        return variant_urls(obj, self.context.get('request'))
+
 
 class FollowSerializer(CustomUserSerializer):
     """Follow serializer."""
@@ -84,12 +101,16 @@ class FollowSerializer(CustomUserSerializer):
         model = User
 
     def get_recipes_count(self, obj):
-        return User.objects.filter(id=obj.id).values_list(
-            'recipes',
-            flat=True
-        ).count()
+        return obj.recipes_count
 
     def get_recipes(self, obj):
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            return ShortRecipeSerializer(
+                recipes_by_author[obj.id],
+                many=True,
+                read_only=True
+            ).data
         query_params = self.context.get('request').query_params
         recipes_limit = query_params.get('recipes_limit')
         if recipes_limit is not None:
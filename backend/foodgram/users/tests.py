@@ -0,0 +1,71 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipe.models import Recipe
+from rest_framework.test import APITestCase
+from users.models import Follow, User
+
+
+class CountersTests(APITestCase):
+    """Counter columns of users and recipes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.follower = [
+            User.objects.create_user(
+                email=f'{name}@foodgram.ru',
+                username=name,
+                first_name='Имя',
+                last_name='Фамилия',
+                password='password'
+            )
+            for name in ('author', 'follower')
+        ]
+
+    def get_followers(self):
+        self.author.refresh_from_db(fields=['followers_count'])
+        return self.author.followers_count
+
+    def test_subscribe(self):
+        self.client.force_authenticate(self.follower)
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.client.post(url)
+        self.assertEqual(self.get_followers(), 1)
+        self.client.delete(url)
+        self.assertEqual(self.get_followers(), 0)
+
+    def test_follower_deleted(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(self.get_followers(), 1)
+        self.follower.delete()
+        self.assertEqual(self.get_followers(), 0)
+
+    def test_save_keeps_counters(self):
+        user = User.objects.get(pk=self.author.pk)
+        Follow.objects.create(user=self.follower, author=self.author)
+        user.first_name = 'Другое'
+        user.save()
+        self.assertEqual(self.get_followers(), 1)
+
+    def test_save_skips_deferred_fields(self):
+        recipe = Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            image='images/recipe.png',
+            text='Описание рецепта.',
+            cooking_time=10
+        )
+        recipe = Recipe.objects.defer('image_variants').get(pk=recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image_variants={'thumbnail': 'images/thumbnail.webp'}
+        )
+        recipe.name = 'Другое'
+        with CaptureQueriesContext(connection) as context:
+            recipe.save()
+        self.assertNotIn(
+            'image_variants',
+            ''.join(query['sql'] for query in context.captured_queries)
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(
+            recipe.image_variants, {'thumbnail': 'images/thumbnail.webp'}
+        )
@@ -1,6 +1,14 @@
+from collections import defaultdict
+
+from api.fast_serializers import FastSerializerMixin, FastUserSerializer
+from api.pagination import CursorPaginationMixin
+from django.db import transaction
+from django.db.models import F, Value, Window
+from django.db.models.functions import RowNumber
 from django.http import Http404
-from django.shortcuts import get_list_or_404, get_object_or_404
+from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet as DjoserUserViewset
+from recipe.models import Recipe
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -11,9 +19,15 @@ from users.serializers import (
 )
 
 
-class UserViewSet(DjoserUserViewset):
+class UserViewSet(
+    FastSerializerMixin,
+    CursorPaginationMixin,
+    DjoserUserViewset
+):
     """Viewset for managing Followers"""
 
+    fast_serializer_class = FastUserSerializer
+
     def get(self, request):
         """Get method for users."""
         serializer = CustomUserSerializer(
@@ -24,13 +38,53 @@ class UserViewSet(DjoserUserViewset):
         serializer.is_valid(raise_exception=True)
         return Response(serializer.data)
 
+    def get_recipes_by_author(self, authors):
+        """
+        Recipes of given authors in one query.
+
+        With recipes_limit only first recipes of every author are
+        selected, numbered by a window function partitioned by author.
+        """
+        recipes = Recipe.objects.filter(
+            author_id__in=[author.id for author in authors]
+        ).only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time',
+            'author_id'
+        )
+        try:
+            recipes_limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            recipes_limit = None
+        if recipes_limit is not None:
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('name').desc()
+            )).filter(row_number__lte=recipes_limit)
+        recipes_by_author = defaultdict(list)
+        for recipe in recipes.order_by('-name'):
+            recipes_by_author[recipe.author_id].append(recipe)
+        return recipes_by_author
+
+    def get_subscriptions_queryset(self):
+        """Authors followed by current user."""
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).order_by('id')
+
     @action(detail=False)
     def subscriptions(self, request):
-        follow = get_list_or_404(User, following__user=self.request.user)
-        page = self.paginate_queryset(follow)
+        page = self.paginate_queryset(self.get_subscriptions_queryset())
+        if not page:
+            raise Http404
         serializer = FollowListSerializer(
             page,
-            context={'request': request},
+            context={
+                'request': request,
+                'recipes_by_author': self.get_recipes_by_author(page)
+            },
             partial=True,
             many=True)
         return self.get_paginated_response(serializer.data)
@@ -52,7 +106,9 @@ class UserViewSet(DjoserUserViewset):
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            Follow.objects.create(user=user, author=author)
+            #  Счетчик подписчиков меняет сигнал, в той же транзакции.
+            with transaction.atomic():
+                Follow.objects.create(user=user, author=author)
             serializer.save(user=user, author=author)
             return Response(serializer.data)
         if self.request.method == 'DELETE':
@@ -62,7 +118,8 @@ class UserViewSet(DjoserUserViewset):
                     user=user,
                     author=author
                 )
-                follow.delete()
+                with transaction.atomic():
+                    follow.delete()
                 return Response(status=status.HTTP_204_NO_CONTENT)
             except Http404:
                 return Response(